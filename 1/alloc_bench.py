@@ -0,0 +1,172 @@
+import os
+import time
+import random
+from collections import deque
+import config
+from alloc_trace import OP_ALLOC, OP_REALLOC, OP_FREE, trace_ops
+from arena_allocator import ArenaAllocator
+from compact_tree import CompactTree
+from thread_cache import ThreadCachedAllocator
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def uniform_trace(rnd, count, slots=100, min_size=1, max_size=4094 * 10):
+    live = [False] * slots
+    for _ in range(count):
+        idx = rnd.randrange(slots)
+        if not live[idx]:
+            live[idx] = True
+            yield OP_ALLOC, idx, rnd.randint(min_size, max_size)
+        elif rnd.getrandbits(1):
+            yield OP_REALLOC, idx, rnd.randint(min_size, max_size)
+        else:
+            live[idx] = False
+            yield OP_FREE, idx, 0
+    for idx, used in enumerate(live):
+        if used:
+            yield OP_FREE, idx, 0
+
+def power_law_size(rnd, alpha=1.6, min_size=16, max_size=1 << 20):
+    return min(max_size, int(min_size * rnd.paretovariate(alpha)))
+
+def power_law_trace(rnd, count, slots=1000):
+    live = [False] * slots
+    for _ in range(count):
+        idx = rnd.randrange(slots)
+        if not live[idx]:
+            live[idx] = True
+            yield OP_ALLOC, idx, power_law_size(rnd)
+        elif rnd.random() < 0.3:
+            yield OP_REALLOC, idx, power_law_size(rnd)
+        else:
+            live[idx] = False
+            yield OP_FREE, idx, 0
+    for idx, used in enumerate(live):
+        if used:
+            yield OP_FREE, idx, 0
+
+def producer_consumer_trace(rnd, count, depth=256, long_lived=0.02):
+    queue = deque()
+    kept = []
+    next_id = 0
+    for _ in range(count):
+        if queue and (len(queue) >= depth or rnd.random() < 0.45):
+            yield OP_FREE, queue.popleft(), 0
+            continue
+        size = power_law_size(rnd, 1.8, 64, 64 * 1024)
+        if rnd.random() < long_lived:
+            kept.append(next_id)
+        else:
+            queue.append(next_id)
+        yield OP_ALLOC, next_id, size
+        next_id += 1
+    for ident in list(queue) + kept:
+        yield OP_FREE, ident, 0
+
+WORKLOADS = {
+    'uniform': uniform_trace,
+    'power_law': power_law_trace,
+    'producer_consumer': producer_consumer_trace,
+}
+
+STRATEGIES = {
+    'arena': ArenaAllocator,
+    'arena_no_slab': lambda: ArenaAllocator(slab_limit=0),
+    'compact_tree': lambda: ArenaAllocator(tree_class=CompactTree),
+    'augmented': lambda: ArenaAllocator(placement='augmented'),
+    'address_fit': lambda: ArenaAllocator(placement='address_fit'),
+    'first_fit': lambda: ArenaAllocator(placement='first_fit'),
+    'next_fit': lambda: ArenaAllocator(placement='next_fit'),
+    'tlsf': lambda: ArenaAllocator(placement='tlsf'),
+    'deferred': lambda: ArenaAllocator(deferred_limit=256 * 1024),
+    'thread_cached': ThreadCachedAllocator,
+}
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def fragmentation(heap):
+    return heap.stats()['fragmentation']
+
+def touch_pages(data):
+    if data is not None and len(data):
+        data[::config.PAGE_SIZE] = bytes(len(range(0, len(data), config.PAGE_SIZE)))
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run_trace(heap, ops, sample_every=1000):
+    clock = time.perf_counter_ns
+    buffers = {}
+    latencies = []
+    base_rss = peak_rss = current_rss()
+    worst_fragmentation = 0.0
+    elapsed = 0
+    for count, (op, ident, size) in enumerate(ops):
+        if op == OP_ALLOC:
+            started = clock()
+            data = heap.alloc(size)
+            spent = clock() - started
+            buffers[ident] = data
+            touch_pages(data)
+        elif op == OP_REALLOC:
+            started = clock()
+            data = heap.realloc(buffers[ident], size)
+            spent = clock() - started
+            buffers[ident] = data
+            touch_pages(data)
+        else:
+            data = buffers.pop(ident)
+            started = clock()
+            heap.free(data)
+            spent = clock() - started
+        latencies.append(spent)
+        elapsed += spent
+        if count % sample_every == 0:
+            peak_rss = max(peak_rss, current_rss())
+            worst_fragmentation = max(worst_fragmentation, fragmentation(heap))
+    latencies.sort()
+    return {
+        'ops': len(latencies),
+        'seconds': elapsed / 1e9,
+        'ops_per_sec': len(latencies) * 1e9 / elapsed if elapsed else 0.0,
+        'p50_ns': percentile(latencies, 0.50),
+        'p99_ns': percentile(latencies, 0.99),
+        'peak_rss_kb': peak_rss - base_rss,
+        'fragmentation': worst_fragmentation,
+    }
+
+def run_benchmarks(count=20000, seed=config.SEED, workloads=None, strategies=None, trace_path=None, verbose=True):
+    if trace_path:
+        sources = [(os.path.basename(trace_path), lambda: trace_ops(trace_path))]
+    else:
+        sources = []
+        for workload in workloads or WORKLOADS:
+            ops = list(WORKLOADS[workload](random.Random(seed), count))
+            sources.append((workload, lambda ops=ops: ops))
+    results = []
+    if verbose:
+        print("{:<18} {:<14} {:>10} {:>9} {:>9} {:>10} {:>7}".format(
+            "Навантаження", "Стратегія", "оп/с", "p50, нс", "p99, нс", "RSS, КБ", "фрагм."))
+    for workload, ops in sources:
+        for strategy in strategies or STRATEGIES:
+            result = run_trace(STRATEGIES[strategy](), ops())
+            result['workload'] = workload
+            result['strategy'] = strategy
+            results.append(result)
+            if verbose:
+                print("{:<18} {:<14} {:>10.0f} {:>9} {:>9} {:>10} {:>7.3f}".format(
+                    workload, strategy, result['ops_per_sec'], result['p50_ns'],
+                    result['p99_ns'], result['peak_rss_kb'], result['fragmentation']))
+    return results
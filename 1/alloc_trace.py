@@ -0,0 +1,84 @@
+import struct
+import time
+import threading
+
+OP_ALLOC = 0
+OP_REALLOC = 1
+OP_FREE = 2
+
+MAGIC = b'ATRC\x01'
+RECORD = struct.Struct('<BIQQ')
+CHUNK_RECORDS = 4096
+
+class TraceRecorder:
+    def __init__(self, path):
+        self.out = open(path, 'wb')
+        self.out.write(MAGIC)
+        self.lock = threading.Lock()
+        self.ids = {}
+        self.next_id = 0
+        self.started = time.perf_counter_ns()
+
+    def _write(self, op, ident, size):
+        self.out.write(RECORD.pack(op, ident, size, time.perf_counter_ns() - self.started))
+
+    def on_alloc(self, data, length):
+        if data is None:
+            return
+        with self.lock:
+            ident = self.next_id
+            self.next_id += 1
+            self.ids[id(data)] = (data, ident)
+            self._write(OP_ALLOC, ident, length)
+
+    def on_realloc(self, old_data, data, length):
+        if old_data is None:
+            self.on_alloc(data, length)
+            return
+        if data is None:
+            return
+        with self.lock:
+            entry = self.ids.pop(id(old_data), None)
+            if entry is None:
+                return
+            self.ids[id(data)] = (data, entry[1])
+            self._write(OP_REALLOC, entry[1], length)
+
+    def on_free(self, data):
+        if data is None:
+            return
+        with self.lock:
+            entry = self.ids.pop(id(data), None)
+            if entry is not None:
+                self._write(OP_FREE, entry[1], 0)
+
+    def close(self):
+        with self.lock:
+            self.out.close()
+            self.ids.clear()
+
+def read_trace(path):
+    with open(path, 'rb') as trace:
+        if trace.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Невідомий формат трасування: {}".format(path))
+        while True:
+            chunk = trace.read(RECORD.size * CHUNK_RECORDS)
+            if not chunk:
+                return
+            usable = len(chunk) - len(chunk) % RECORD.size
+            yield from RECORD.iter_unpack(chunk[:usable])
+
+def trace_ops(path):
+    for op, ident, size, _ in read_trace(path):
+        yield op, ident, size
+
+def replay_trace(path, heap):
+    buffers = {}
+    for op, ident, size in trace_ops(path):
+        if op == OP_ALLOC:
+            buffers[ident] = heap.alloc(size)
+        elif op == OP_REALLOC:
+            buffers[ident] = heap.realloc(buffers[ident], size)
+        else:
+            heap.free(buffers.pop(ident))
+    return buffers
@@ -0,0 +1,786 @@
+import os
+import heapq
+import struct
+import config
+from block_manager import (FLAG_USED, FLAG_TERMINAL, SIZE_MASK, write_header, block_size, block_used,
+                           block_terminal, block_prev_size, mark_free, next_block, prev_block,
+                           divide_block, combine_blocks, hint_unused)
+from kernel_core import get_pages, map_file, return_pages, reset_area, RESET_ZERO, RESET_POISON
+from slab_cache import SlabCache
+from placement import placement_index
+from block_handle import BlockHandle, bump_generation
+
+ARENA_SIZE = config.ARENA_PAGES * config.PAGE_SIZE
+BLOCK_SIZE_MAX = ARENA_SIZE - config.META
+ADDR_SHIFT = 40
+OFFSET_MASK = (1 << ADDR_SHIFT) - 1
+
+SNAPSHOT_MAGIC = b'AHEAP\x03\x00\x00'
+SNAPSHOT_HEADER = struct.Struct('<8sQQQ')
+SNAPSHOT_IMAGE = struct.Struct('<QQQQQ')
+SNAPSHOT_SLOT = struct.Struct('<QQ')
+
+def round_bytes(length):
+    return (length + config.ALIGN - 1) & ~(config.ALIGN - 1)
+
+def round_pages(length):
+    return (length + config.PAGE_SIZE - 1) & ~(config.PAGE_SIZE - 1)
+
+def read_record(source, layout):
+    data = source.read(layout.size)
+    if len(data) != layout.size:
+        raise ValueError("Пошкоджений знімок")
+    return layout.unpack(data)
+
+class Arena:
+    def __init__(self, pages, size):
+        self.pages = pages
+        self.size = size
+        self.view = memoryview(pages)
+        self.words = self.view.cast('Q')
+        self.index = 0
+        self.base = 0
+        self.file_backed = False
+        self.generations = {}
+        self.released = bytearray(size // config.PAGE_SIZE)
+
+    def walk(self):
+        offset = 0
+        while offset < self.size:
+            head = self.words[offset >> 3]
+            yield offset, head & SIZE_MASK, bool(head & FLAG_USED)
+            offset += config.META + (head & SIZE_MASK)
+
+class LargeBlock:
+    def __init__(self, pages, size, base=0):
+        self.pages = pages
+        self.size = size
+        self.base = base
+        self.generations = {}
+
+class ArenaAllocator:
+    def __init__(self, slab_limit=config.SLAB_LIMIT, tree_class=None, spare_arenas=config.SPARE_ARENAS,
+                 large_limit=config.LARGE_LIMIT, placement=config.PLACEMENT, deferred_limit=config.DEFERRED_LIMIT,
+                 poison_freed=config.POISON_FREED):
+        self.free_tree = (tree_class or placement_index(placement))()
+        self.arenas = []
+        self.spare_limit = spare_arenas
+        self.spare_arenas = set()
+        self.pinned_arenas = set()
+        self.mapped_bytes = 0
+        self.arena_map = {}
+        self.next_index = 0
+        self.live = {}
+        self.free_nodes = {}
+        self.slab_limit = slab_limit
+        self.slabs = SlabCache() if slab_limit else None
+        self.poison_freed = poison_freed
+        if self.slabs:
+            self.slabs.poison = poison_freed
+            self.slabs.next_base = self._next_base
+        self.released_bytes = 0
+        self.released_total = 0
+        self.large_limit = large_limit
+        self.large = {}
+        self.large_bytes = 0
+        self.large_pinned = []
+        self.block_count = 0
+        self.free_bytes = 0
+        self.free_blocks = 0
+        self.largest_free = 0
+        self.largest_stale = False
+        self.free_histogram = [0] * 64
+        self.deferred_limit = deferred_limit
+        self.deferred = {}
+        self.deferred_sizes = []
+        self.deferred_queued = set()
+        self.deferred_bytes = 0
+        self.deferred_blocks = 0
+
+    def _new_arena(self, size):
+        if size > BLOCK_SIZE_MAX:
+            arena_size = round_pages(size + config.META)
+        else:
+            arena_size = ARENA_SIZE
+        pages = get_pages(arena_size)
+        if pages is None:
+            return None
+        arena = self._attach_arena(pages, arena_size)
+        write_header(arena.words, 0, arena_size - config.META, 0, FLAG_TERMINAL)
+        self.block_count += 1
+        return arena
+
+    def _next_base(self):
+        self.next_index += 1
+        return self.next_index << ADDR_SHIFT
+
+    def _attach_arena(self, pages, arena_size, base=None):
+        arena = Arena(pages, arena_size)
+        arena.base = self._next_base() if base is None else base
+        arena.index = arena.base >> ADDR_SHIFT
+        self.arena_map[arena.index] = arena
+        self.arenas.append(arena)
+        self.mapped_bytes += arena_size
+        return arena
+
+    def _unmap_arena(self, arena):
+        blocks = sum(1 for _ in arena.walk())
+        arena.words.release()
+        arena.view.release()
+        try:
+            return_pages(arena.pages, arena.size)
+        except BufferError:
+            arena.view = memoryview(arena.pages)
+            arena.words = arena.view.cast('Q')
+            self.pinned_arenas.add(arena)
+            return False
+        self.block_count -= blocks
+        self.arenas.remove(arena)
+        self.spare_arenas.discard(arena)
+        self.pinned_arenas.discard(arena)
+        del self.arena_map[arena.index]
+        self.mapped_bytes -= arena.size
+        self.released_bytes -= (len(arena.released) - arena.released.count(0)) * config.PAGE_SIZE
+        return True
+
+    def _retire_arena(self, arena):
+        if arena.size == ARENA_SIZE and len(self.spare_arenas) < self.spare_limit:
+            self.spare_arenas.add(arena)
+            return False
+        return self._unmap_arena(arena)
+
+    def _locate(self, addr):
+        return self.arena_map[addr >> ADDR_SHIFT], addr & OFFSET_MASK
+
+    def _addr_size(self, addr):
+        arena, offset = self._locate(addr)
+        return block_size(arena.words, offset)
+
+    def _tree_add(self, addr, size):
+        self.free_nodes[addr] = self.free_tree.add_node(size, addr)
+        self._count_free(size)
+
+    def _tree_add_many(self, blocks):
+        add_many = getattr(self.free_tree, 'add_many', None)
+        if add_many is None or len(blocks) < 2:
+            for addr, size in blocks:
+                self._tree_add(addr, size)
+            return
+        nodes = add_many([size for _, size in blocks], [addr for addr, _ in blocks])
+        for (addr, size), node in zip(blocks, nodes):
+            self.free_nodes[addr] = node
+            self._count_free(size)
+
+    def _count_free(self, size):
+        self.free_bytes += size
+        self.free_blocks += 1
+        self.free_histogram[size.bit_length()] += 1
+        if size > self.largest_free or (size == self.largest_free and self.largest_stale):
+            self.largest_free = size
+            self.largest_stale = False
+
+    def _tree_remove(self, arena, offset):
+        size = block_size(arena.words, offset)
+        self.free_tree.remove_node(self.free_nodes.pop(arena.base + offset))
+        self.free_bytes -= size
+        self.free_blocks -= 1
+        self.free_histogram[size.bit_length()] -= 1
+        if size == self.largest_free:
+            self.largest_stale = True
+
+    def _largest_free(self):
+        if self.largest_stale:
+            node = self.free_tree.last()
+            self.largest_free = self._addr_size(self.free_tree.node_data(node)) if node else 0
+            self.largest_stale = False
+        return self.largest_free
+
+    def _free_neighbour(self, arena, offset):
+        return offset is not None and not block_used(arena.words, offset)
+
+    def _split(self, arena, offset, size):
+        rest = divide_block(arena.words, offset, size, config.META, config.MIN_BLOCK)
+        if rest is not None:
+            self.block_count += 1
+            self._claim_pages(arena, rest, rest + config.META)
+        return rest
+
+    def _merge(self, arena, base, target):
+        combine_blocks(arena.words, base, target, config.META)
+        self.block_count -= 1
+
+    def _take_free(self, addr):
+        arena, offset = self._locate(addr)
+        self._tree_remove(arena, offset)
+        if offset == 0 and block_terminal(arena.words, offset):
+            self.spare_arenas.discard(arena)
+            self.pinned_arenas.discard(arena)
+        return arena, offset
+
+    def _drop_pinned_arenas(self):
+        pinned, self.pinned_arenas = self.pinned_arenas, set()
+        for arena in pinned:
+            self._tree_remove(arena, 0)
+            if not self._unmap_arena(arena):
+                self._tree_add(arena.base, block_size(arena.words, 0))
+
+    def _note_released(self, arena, start, end, zeroed):
+        first, last = start // config.PAGE_SIZE, end // config.PAGE_SIZE
+        self.released_total += end - start
+        self.released_bytes += arena.released[first:last].count(0) * config.PAGE_SIZE
+        zeroed = zeroed and not arena.file_backed
+        arena.released[first:last] = (b'\x01' if zeroed else b'\x02') * (last - first)
+
+    def _zero_payload(self, arena, start, end):
+        released = arena.released
+        page = start // config.PAGE_SIZE
+        last = (end + config.PAGE_SIZE - 1) // config.PAGE_SIZE
+        while page < last:
+            if released[page] == 1:
+                page += 1
+                continue
+            stop = released.find(1, page, last)
+            if stop < 0:
+                stop = last
+            run_start = max(page * config.PAGE_SIZE, start)
+            run_end = min(stop * config.PAGE_SIZE, end)
+            reset_area(arena.pages, run_end - run_start, run_start, RESET_ZERO)
+            page = stop
+
+    def _claim_pages(self, arena, start, end):
+        first = start // config.PAGE_SIZE
+        last = (end + config.PAGE_SIZE - 1) // config.PAGE_SIZE
+        claimed = (last - first) - arena.released[first:last].count(0)
+        if claimed:
+            self.released_bytes -= claimed * config.PAGE_SIZE
+            arena.released[first:last] = bytes(last - first)
+
+    def _expose(self, arena, offset, length, zero=False):
+        start = offset + config.META
+        if zero:
+            self._zero_payload(arena, start, start + length)
+        self._claim_pages(arena, start, start + block_size(arena.words, offset))
+        arena.words[(offset >> 3) + 2] = length
+        view = arena.view[start:start + length]
+        self.live[id(view)] = (view, arena.base + offset)
+        return view
+
+    def _lookup(self, data):
+        entry = self.live.get(id(data))
+        if entry is None or entry[0] is not data:
+            raise ValueError("Невідомий блок пам'яті")
+        return self._locate(entry[1])
+
+    def _expose_large(self, block, length):
+        view = memoryview(block.pages)[:length]
+        self.large[id(view)] = (view, block)
+        return view
+
+    def _is_large(self, data):
+        entry = self.large.get(id(data))
+        return entry is not None and entry[0] is data
+
+    def _alloc_large(self, length):
+        size = round_pages(length)
+        pages = get_pages(size)
+        if pages is None:
+            return None
+        self.large_bytes += size
+        return self._expose_large(LargeBlock(pages, size, self._next_base()), length)
+
+    def _close_large(self, block):
+        try:
+            return_pages(block.pages, block.size)
+        except BufferError:
+            self.large_pinned.append(block)
+            return
+        self.large_bytes -= block.size
+
+    def _drop_pinned(self):
+        pinned, self.large_pinned = self.large_pinned, []
+        for block in pinned:
+            self._close_large(block)
+
+    def _free_large(self, data):
+        _, block = self.large.pop(id(data))
+        data.release()
+        bump_generation(block.generations, 0)
+        self._close_large(block)
+
+    def _realloc_large(self, data, length):
+        block = self.large[id(data)][1]
+        if length <= self.large_limit:
+            new_data = self.alloc(length)
+            if new_data is not None:
+                new_data[:] = data[:length]
+                self._free_large(data)
+            return new_data
+        size = round_pages(length)
+        spare = None
+        if size > block.size:
+            spare = get_pages(size)
+            if spare is None:
+                return None
+        del self.large[id(data)]
+        data.release()
+        bump_generation(block.generations, 0)
+        if size != block.size:
+            try:
+                block.pages.resize(size)
+            except (OSError, SystemError, BufferError, TypeError):
+                if spare is None:
+                    size = block.size
+                else:
+                    spare[:block.size] = block.pages[:block.size]
+                    self.large_bytes += block.size
+                    self._close_large(LargeBlock(block.pages, block.size))
+                    block.pages, spare = spare, None
+            self.large_bytes += size - block.size
+            block.size = size
+        if spare is not None:
+            return_pages(spare, size)
+        return self._expose_large(block, length)
+
+    def alloc(self, length, zero=False):
+        if self.large_limit and length > self.large_limit:
+            return self._alloc_large(length)
+        if self.slabs and length <= self.slab_limit:
+            data = self.slabs.alloc(length)
+            if data is not None:
+                if zero:
+                    data[:] = bytes(length)
+                return data
+        size = max(round_bytes(length), config.MIN_BLOCK)
+        quick = self.deferred.get(size)
+        if quick:
+            arena, offset = self._locate(quick.popitem()[0])
+            self.deferred_bytes -= size
+            self.deferred_blocks -= 1
+            return self._expose(arena, offset, length, zero)
+        node = self._find_free(size)
+        if node:
+            arena, offset = self._take_free(self.free_tree.node_data(node))
+        else:
+            arena, offset = self._new_arena(size), 0
+            if arena is None:
+                return None
+        rest = self._split(arena, offset, size)
+        if rest is not None:
+            self._tree_add(arena.base + rest, block_size(arena.words, rest))
+        return self._expose(arena, offset, length, zero)
+
+    def _coalesce(self, arena, offset):
+        following = next_block(arena.words, offset, config.META)
+        if self._free_neighbour(arena, following):
+            self._tree_remove(arena, following)
+            self._merge(arena, offset, following)
+        previous = prev_block(arena.words, offset, config.META)
+        if self._free_neighbour(arena, previous):
+            self._tree_remove(arena, previous)
+            self._merge(arena, previous, offset)
+            offset = previous
+        return offset
+
+    def _settle(self, arena, offset, pending=None):
+        if offset == 0 and block_terminal(arena.words, offset) and self._retire_arena(arena):
+            return
+        size = block_size(arena.words, offset)
+        released = hint_unused(arena.pages, offset, size, config.PAGE_SIZE, config.META, config.MIN_BLOCK)
+        if released:
+            self._note_released(arena, *released)
+        if pending is None:
+            self._tree_add(arena.base + offset, size)
+        else:
+            pending.append((arena.base + offset, size))
+
+    def _detach(self, data):
+        arena, offset = self._lookup(data)
+        del self.live[id(data)]
+        data.release()
+        bump_generation(arena.generations, offset)
+        if self.poison_freed:
+            reset_area(arena.pages, block_size(arena.words, offset), offset + config.META, RESET_POISON)
+        return arena, offset
+
+    def free(self, data):
+        if data is None:
+            return
+        if self._is_large(data):
+            self._free_large(data)
+            return
+        if self.slabs and self.slabs.owns(data):
+            self.slabs.free(data)
+            return
+        arena, offset = self._detach(data)
+        if self.deferred_limit:
+            self._defer(arena, offset)
+            return
+        mark_free(arena.words, offset)
+        self._settle(arena, self._coalesce(arena, offset))
+
+    def _defer(self, arena, offset):
+        size = block_size(arena.words, offset)
+        self.deferred.setdefault(size, {})[arena.base + offset] = None
+        if size not in self.deferred_queued:
+            self.deferred_queued.add(size)
+            heapq.heappush(self.deferred_sizes, -size)
+        self.deferred_bytes += size
+        self.deferred_blocks += 1
+        if self.deferred_bytes > self.deferred_limit:
+            self._flush_deferred(self.deferred_limit)
+
+    def _flush_deferred(self, limit):
+        blocks = []
+        while self.deferred_bytes > limit:
+            size = -self.deferred_sizes[0]
+            quick = self.deferred[size]
+            if not quick:
+                heapq.heappop(self.deferred_sizes)
+                self.deferred_queued.discard(size)
+                continue
+            blocks.append(quick.popitem()[0])
+            self.deferred_bytes -= size
+            self.deferred_blocks -= 1
+        self._release_blocks(blocks)
+
+    def _find_free(self, size):
+        node = self.free_tree.best_match(size)
+        while node is None and self.deferred_blocks:
+            self._flush_deferred(max(self.deferred_bytes - size, 0))
+            node = self.free_tree.best_match(size)
+        return node
+
+    def coalesce_deferred(self):
+        blocks = [addr for quick in self.deferred.values() for addr in quick]
+        self.deferred.clear()
+        del self.deferred_sizes[:]
+        self.deferred_queued.clear()
+        self.deferred_bytes = 0
+        self.deferred_blocks = 0
+        self._release_blocks(blocks)
+
+    def idle(self):
+        if self.deferred_blocks:
+            self.coalesce_deferred()
+        if self.large_pinned:
+            self._drop_pinned()
+        if self.pinned_arenas:
+            self._drop_pinned_arenas()
+
+    def _alloc_run(self, lengths):
+        sizes = [max(round_bytes(length), config.MIN_BLOCK) for length in lengths]
+        total = sum(sizes) + config.META * (len(sizes) - 1)
+        node = self._find_free(total)
+        if node:
+            arena, offset = self._take_free(self.free_tree.node_data(node))
+        else:
+            arena, offset = self._new_arena(total), 0
+            if arena is None:
+                return [self.alloc(length) for length in lengths]
+        views = []
+        for length, size in zip(lengths, sizes):
+            rest = self._split(arena, offset, size)
+            views.append(self._expose(arena, offset, length))
+            offset = rest
+        if offset is not None:
+            self._tree_add(arena.base + offset, block_size(arena.words, offset))
+        return views
+
+    def _small_class(self, length):
+        if not self.slabs or length > self.slab_limit or (self.large_limit and length > self.large_limit):
+            return None
+        return self.slabs.size_class(length)
+
+    def alloc_many(self, lengths):
+        result = [None] * len(lengths)
+        order = sorted(range(len(lengths)), key=lambda idx: lengths[idx])
+        pending = []
+        start = 0
+        while start < len(order):
+            idx = order[start]
+            if self.large_limit and lengths[idx] > self.large_limit:
+                result[idx] = self._alloc_large(lengths[idx])
+                start += 1
+                continue
+            size_class = self._small_class(lengths[idx])
+            if size_class is None:
+                pending.append(idx)
+                start += 1
+                continue
+            stop = start + 1
+            while stop < len(order) and self._small_class(lengths[order[stop]]) is size_class:
+                stop += 1
+            slots = self.slabs.take(size_class, stop - start)
+            for idx, (slab, offset) in zip(order[start:stop], slots):
+                result[idx] = self.slabs.expose(slab, offset, lengths[idx])
+            pending.extend(order[start + len(slots):stop])
+            start = stop
+        pending.sort()
+        run = []
+        run_size = 0
+        for idx in pending:
+            size = max(round_bytes(lengths[idx]), config.MIN_BLOCK)
+            if run and run_size + config.META + size > BLOCK_SIZE_MAX:
+                self._fill_run(result, lengths, run)
+                run = []
+            run_size = run_size + config.META + size if run else size
+            run.append(idx)
+        if run:
+            self._fill_run(result, lengths, run)
+        return result
+
+    def _fill_run(self, result, lengths, run):
+        for idx, view in zip(run, self._alloc_run([lengths[idx] for idx in run])):
+            result[idx] = view
+
+    def free_many(self, buffers):
+        blocks = []
+        small = []
+        for data in buffers:
+            if data is None:
+                continue
+            if self._is_large(data):
+                self._free_large(data)
+            elif self.slabs and self.slabs.owns(data):
+                small.append(self.slabs.release_slot(data))
+            else:
+                arena, offset = self._detach(data)
+                blocks.append(arena.base + offset)
+        if small:
+            self.slabs.put(small)
+        self._release_blocks(blocks)
+
+    def _release_blocks(self, blocks):
+        pending = []
+        run_arena = run = None
+        for addr in sorted(blocks):
+            arena, offset = self._locate(addr)
+            mark_free(arena.words, offset)
+            if run_arena is arena:
+                following = next_block(arena.words, run, config.META)
+                if following != offset and self._free_neighbour(arena, following):
+                    self._tree_remove(arena, following)
+                    self._merge(arena, run, following)
+                    following = next_block(arena.words, run, config.META)
+                if following == offset:
+                    self._merge(arena, run, offset)
+                    continue
+            if run is not None:
+                self._settle(run_arena, self._coalesce(run_arena, run), pending)
+            run_arena, run = arena, offset
+        if run is not None:
+            self._settle(run_arena, self._coalesce(run_arena, run), pending)
+        self._tree_add_many(pending)
+
+    def _shrink_block(self, arena, offset, size):
+        rest = self._split(arena, offset, size)
+        if rest is not None:
+            following = next_block(arena.words, rest, config.META)
+            if self._free_neighbour(arena, following):
+                self._tree_remove(arena, following)
+                self._merge(arena, rest, following)
+            self._tree_add(arena.base + rest, block_size(arena.words, rest))
+
+    def _expand_block(self, arena, offset, size):
+        following = next_block(arena.words, offset, config.META)
+        if not self._free_neighbour(arena, following):
+            return False
+        if block_size(arena.words, offset) + block_size(arena.words, following) + config.META < size:
+            return False
+        self._tree_remove(arena, following)
+        self._merge(arena, offset, following)
+        rest = self._split(arena, offset, size)
+        if rest is not None:
+            self._tree_add(arena.base + rest, block_size(arena.words, rest))
+        return True
+
+    def _reexpose(self, data, arena, offset, length):
+        del self.live[id(data)]
+        data.release()
+        bump_generation(arena.generations, offset)
+        return self._expose(arena, offset, length)
+
+    def _realloc_small(self, data, length):
+        new_data = self.slabs.resize(data, length)
+        if new_data is None:
+            new_data = self.alloc(length)
+            if new_data is not None:
+                new_data[:len(data)] = data
+                self.slabs.free(data)
+        return new_data
+
+    def realloc(self, data, length):
+        if data is None:
+            return self.alloc(length)
+        if self._is_large(data):
+            return self._realloc_large(data, length)
+        if self.slabs and self.slabs.owns(data):
+            return self._realloc_small(data, length)
+        arena, offset = self._lookup(data)
+        size = max(round_bytes(length), config.MIN_BLOCK)
+        if size <= block_size(arena.words, offset):
+            self._shrink_block(arena, offset, size)
+            return self._reexpose(data, arena, offset, length)
+        if self._expand_block(arena, offset, size):
+            return self._reexpose(data, arena, offset, length)
+        new_data = self.alloc(length)
+        if new_data is not None:
+            new_data[:len(data)] = data
+            self.free(data)
+        return new_data
+
+    def free_at_least(self, size):
+        if hasattr(self.free_tree, 'count_at_least'):
+            return self.free_tree.count_at_least(size), self.free_tree.total_at_least(size)
+        sizes = [self._addr_size(self.free_tree.node_data(node)) for node in self.free_tree]
+        sizes = [free_size for free_size in sizes if free_size >= size]
+        return len(sizes), sum(sizes)
+
+    def kth_largest_free(self, k):
+        if hasattr(self.free_tree, 'kth_largest'):
+            node = self.free_tree.kth_largest(k)
+            return node.val if node else None
+        sizes = sorted((self._addr_size(self.free_tree.node_data(node)) for node in self.free_tree), reverse=True)
+        return sizes[k - 1] if 0 < k <= len(sizes) else None
+
+    def handle(self, data):
+        entry = self.large.get(id(data))
+        if entry is not None and entry[0] is data:
+            return BlockHandle(data, entry[1].generations, 0)
+        if self.slabs and self.slabs.owns(data):
+            _, slab, offset = self.slabs.live[id(data)]
+            return BlockHandle(data, slab.generations, offset)
+        arena, offset = self._lookup(data)
+        return BlockHandle(data, arena.generations, offset)
+
+    def address(self, data):
+        entry = self.large.get(id(data))
+        if entry is not None and entry[0] is data:
+            return entry[1].base
+        if self.slabs and self.slabs.owns(data):
+            _, slab, offset = self.slabs.live[id(data)]
+            return slab.base + offset
+        arena, offset = self._lookup(data)
+        return arena.base + offset
+
+    def snapshot(self, path):
+        import tempfile
+        self.idle()
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path) + '.')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                self._write_snapshot(out)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def _write_snapshot(self, out):
+        slabs = self.slabs.live_slots() if self.slabs else {}
+        images = [(arena.base, arena.size, 0, (), arena.view) for arena in self.arenas]
+        images += [(slab.base, self.slabs.slab_size, slab.slot_size, slots, slab.view) for slab, slots in slabs.items()]
+        images += [(block.base, block.size, len(view), (), block.pages) for view, block in self.large.values()]
+        offset = round_pages(SNAPSHOT_HEADER.size + SNAPSHOT_IMAGE.size * len(images)
+                             + SNAPSHOT_SLOT.size * sum(len(slots) for slots in slabs.values()))
+        out.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(self.arenas), len(slabs), len(self.large)))
+        for base, size, length, slots, _ in images:
+            out.write(SNAPSHOT_IMAGE.pack(base, size, offset, length, len(slots)))
+            for slot in slots:
+                out.write(SNAPSHOT_SLOT.pack(*slot))
+            offset += size
+        out.seek(round_pages(out.tell()))
+        for image in images:
+            out.write(image[4])
+
+    def _restore_arena(self, pages, size, base):
+        arena = self._attach_arena(pages, size, base)
+        arena.file_backed = True
+        words = arena.words
+        buffers = {}
+        free = []
+        offset = prev_size = 0
+        while offset < size:
+            block = block_size(words, offset)
+            end = offset + config.META + block
+            if (end > size or bool(block_terminal(words, offset)) != (end == size)
+                    or block_prev_size(words, offset) != prev_size):
+                raise ValueError("Пошкоджений знімок арени")
+            self.block_count += 1
+            if block_used(words, offset):
+                buffers[arena.base + offset] = self._expose(arena, offset, min(words[(offset >> 3) + 2], block))
+            else:
+                free.append((arena.base + offset, block))
+            offset, prev_size = end, block
+        return buffers, free
+
+    @classmethod
+    def restore(cls, path, **options):
+        heap = cls(**options)
+        buffers = {}
+        free = []
+        with open(path, 'rb') as source:
+            magic, arena_count, slab_count, large_count = read_record(source, SNAPSHOT_HEADER)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("Невідомий формат знімка: {}".format(path))
+            for _ in range(arena_count):
+                base, size, offset, _, _ = read_record(source, SNAPSHOT_IMAGE)
+                arena_buffers, arena_free = heap._restore_arena(map_file(source, size, offset), size, base)
+                buffers.update(arena_buffers)
+                free += arena_free
+            heap._tree_add_many(sorted(free, key=lambda block: block[1]))
+            for _ in range(slab_count):
+                base, size, offset, slot_size, count = read_record(source, SNAPSHOT_IMAGE)
+                slots = [read_record(source, SNAPSHOT_SLOT) for _ in range(count)]
+                if heap.slabs is None:
+                    raise ValueError("Знімок не відповідає налаштуванням slab-кешу")
+                buffers.update(heap.slabs.restore_slab(map_file(source, size, offset), base, slot_size, slots))
+            for _ in range(large_count):
+                base, size, offset, length, _ = read_record(source, SNAPSHOT_IMAGE)
+                heap.large_bytes += size
+                buffers[base] = heap._expose_large(LargeBlock(map_file(source, size, offset), size, base), length)
+        heap.next_index = max([heap.next_index] + list(heap.arena_map) + [addr >> ADDR_SHIFT for addr in buffers])
+        return heap, buffers
+
+    def stats(self):
+        arena_used = self.mapped_bytes - config.META * self.block_count - self.free_bytes - self.deferred_bytes
+        slab_mapped = self.slabs.mapped_bytes if self.slabs else 0
+        slab_used = self.slabs.used_bytes if self.slabs else 0
+        largest_free = self._largest_free()
+        return {
+            'in_use_bytes': arena_used + slab_used + self.large_bytes,
+            'free_bytes': self.free_bytes,
+            'free_blocks': self.free_blocks,
+            'largest_free': largest_free,
+            'fragmentation': 1.0 - largest_free / self.free_bytes if self.free_bytes else 0.0,
+            'free_histogram': {1 << (bucket - 1): count for bucket, count in enumerate(self.free_histogram) if count},
+            'tree_height': self.free_tree.height(),
+            'deferred_bytes': self.deferred_bytes,
+            'deferred_blocks': self.deferred_blocks,
+            'arenas': len(self.arenas),
+            'spare_arenas': len(self.spare_arenas),
+            'mapped_bytes': self.mapped_bytes,
+            'slab_bytes': slab_mapped,
+            'slab_used_bytes': slab_used,
+            'released_bytes': self.released_bytes,
+            'released_total': self.released_total,
+            'large_blocks': len(self.large) + len(self.large_pinned),
+            'large_bytes': self.large_bytes,
+        }
+
+    def show(self, msg):
+        print("{}:".format(msg))
+        if not self.free_blocks:
+            print("Дерево порожнє")
+            return
+        for node in self.free_tree:
+            addr = self.free_tree.node_data(node)
+            arena, offset = self._locate(addr)
+            print("[{:>20}] {:>10} {:>10} {} {} {}".format(
+                hex(addr),
+                block_size(arena.words, offset),
+                block_prev_size(arena.words, offset),
+                "busy" if block_used(arena.words, offset) else "free",
+                "first" if offset == 0 else "",
+                "last" if block_terminal(arena.words, offset) else ""))
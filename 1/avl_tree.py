@@ -1,6 +1,10 @@
+import heapq
+from collections import Counter
+
 class TreeNode:
-    def __init__(self, val):
+    def __init__(self, val, data=None):
         self.val = val
+        self.data = data
         self.left_child = None
         self.right_child = None
         self.parent_node = None
@@ -9,8 +13,11 @@ class TreeNode:
         self.prev_duplicate = None
 
 class BalancedTree:
+    node_class = TreeNode
+
     def __init__(self):
         self.tree_root = None
+        self.node_count = 0
 
     def _locate(self, key):
         node = self.tree_root
@@ -90,8 +97,9 @@ class BalancedTree:
                 break
             node, parent = parent, parent.parent_node
 
-    def add_node(self, key):
-        new_node = TreeNode(key)
+    def add_node(self, key, data=None):
+        new_node = self.node_class(key, data)
+        self.node_count += 1
         found, parent, direction = self._locate(key)
         if found:
             new_node.next_duplicate = found.next_duplicate
@@ -99,7 +107,7 @@ class BalancedTree:
             found.next_duplicate = new_node
             if new_node.next_duplicate:
                 new_node.next_duplicate.prev_duplicate = new_node
-            return
+            return new_node
         new_node.parent_node = parent
         if not parent:
             self.tree_root = new_node
@@ -108,60 +116,154 @@ class BalancedTree:
         else:
             parent.right_child = new_node
         self.update_balance_insert(new_node)
+        return new_node
 
     def _update_balance_remove(self, node, removed_left):
         while node:
+            parent = node.parent_node
+            parent_left = parent is not None and node == parent.left_child
             node.balance_factor += 1 if removed_left else -1
             if abs(node.balance_factor) == 1:
                 break
             if abs(node.balance_factor) == 2:
-                old_balance = node.balance_factor
+                sibling = node.right_child if node.balance_factor == 2 else node.left_child
+                sibling_balance = sibling.balance_factor
                 self._rebalance(node)
-                if not node.parent_node:
-                    node = self.tree_root
-                else:
-                    node = node.parent_node
-                if old_balance != 0:
+                if sibling_balance == 0:
                     break
-            removed_left = node.parent_node and node == node.parent_node.left_child
-            node = node.parent_node
+            node, removed_left = parent, parent_left
 
-    def delete_node(self, key):
-        node, _, _ = self._locate(key)
-        if not node:
-            return
-        if node.next_duplicate:
+    def _replace_child(self, node, new_node):
+        parent = node.parent_node
+        if not parent:
+            self.tree_root = new_node
+        elif node == parent.left_child:
+            parent.left_child = new_node
+        else:
+            parent.right_child = new_node
+        if new_node:
+            new_node.parent_node = parent
+
+    def _take_place(self, node, successor):
+        successor.left_child = node.left_child
+        successor.right_child = node.right_child
+        successor.balance_factor = node.balance_factor
+        if node.left_child:
+            node.left_child.parent_node = successor
+        if node.right_child:
+            node.right_child.parent_node = successor
+        self._replace_child(node, successor)
+
+    def remove_node(self, node):
+        self.node_count -= 1
+        if node.prev_duplicate:
+            node.prev_duplicate.next_duplicate = node.next_duplicate
+            if node.next_duplicate:
+                node.next_duplicate.prev_duplicate = node.prev_duplicate
+        elif node.next_duplicate:
             successor = node.next_duplicate
-            successor.prev_duplicate = node.prev_duplicate
-            if node.prev_duplicate:
-                node.prev_duplicate.next_duplicate = successor
-            successor.left_child = node.left_child
-            successor.right_child = node.right_child
-            successor.parent_node = node.parent_node
-            successor.balance_factor = node.balance_factor
-            if node.left_child:
-                node.left_child.parent_node = successor
-            if node.right_child:
-                node.right_child.parent_node = successor
-            if not node.parent_node:
-                self.tree_root = successor
-            elif node == node.parent_node.left_child:
-                node.parent_node.left_child = successor
+            successor.prev_duplicate = None
+            self._take_place(node, successor)
+        elif node.left_child and node.right_child:
+            successor = node.right_child
+            while successor.left_child:
+                successor = successor.left_child
+            if successor.parent_node == node:
+                fix_from, removed_left = successor, False
+                right = successor.right_child
+                self._take_place(node, successor)
+                successor.right_child = right
             else:
-                node.parent_node.right_child = successor
-            node = successor
-        child = node.left_child or node.right_child
-        if child:
-            child.parent_node = node.parent_node
-        if not node.parent_node:
-            self.tree_root = child
+                fix_from, removed_left = successor.parent_node, True
+                self._replace_child(successor, successor.right_child)
+                self._take_place(node, successor)
+            self._update_balance_remove(fix_from, removed_left)
         else:
-            left_removed = (node == node.parent_node.left_child)
-            if left_removed:
-                node.parent_node.left_child = child
+            child = node.left_child or node.right_child
+            parent = node.parent_node
+            removed_left = parent is not None and node == parent.left_child
+            self._replace_child(node, child)
+            if parent:
+                self._update_balance_remove(parent, removed_left)
+        node.left_child = node.right_child = node.parent_node = None
+        node.next_duplicate = node.prev_duplicate = None
+        node.balance_factor = 0
+
+    def delete_node(self, key):
+        node, _, _ = self._locate(key)
+        if node:
+            self.remove_node(node)
+
+    def _link_sorted(self, nodes):
+        heads = []
+        tail = None
+        for node in nodes:
+            node.left_child = node.right_child = node.parent_node = None
+            node.next_duplicate = node.prev_duplicate = None
+            node.balance_factor = 0
+            if tail is not None and tail.val == node.val:
+                tail.next_duplicate = node
+                node.prev_duplicate = tail
             else:
-                node.parent_node.right_child = child
-            self._update_balance_remove(node.parent_node, left_removed)
+                heads.append(node)
+            tail = node
+
+        def build(lo, hi, parent):
+            if lo >= hi:
+                return None, 0
+            mid = (lo + hi) // 2
+            node = heads[mid]
+            node.parent_node = parent
+            node.left_child, left_height = build(lo, mid, node)
+            node.right_child, right_height = build(mid + 1, hi, node)
+            node.balance_factor = right_height - left_height
+            return node, max(left_height, right_height) + 1
+
+        self.tree_root, _ = build(0, len(heads), None)
+        self.node_count = len(nodes)
+
+    def build_from_sorted(self, keys, payloads=None):
+        if payloads is None:
+            payloads = [None] * len(keys)
+        nodes = [self.node_class(key, data) for key, data in zip(keys, payloads)]
+        self._link_sorted(nodes)
+        return nodes
+
+    def _batch_rebuilds(self, count):
+        return count * max(self.height(), 1) >= self.node_count
+
+    def add_many(self, keys, payloads=None):
+        if payloads is None:
+            payloads = [None] * len(keys)
+        if not self._batch_rebuilds(len(keys)):
+            return [self.add_node(key, data) for key, data in zip(keys, payloads)]
+        nodes = [self.node_class(key, data) for key, data in zip(keys, payloads)]
+        self._link_sorted(list(heapq.merge(self, sorted(nodes, key=lambda node: node.val),
+                                           key=lambda node: node.val)))
+        return nodes
+
+    def delete_many(self, keys):
+        if not self._batch_rebuilds(len(keys)):
+            for key in keys:
+                self.delete_node(key)
+            return
+        pending = Counter(keys)
+        kept = []
+        removed = []
+        for node in self:
+            if pending[node.val]:
+                pending[node.val] -= 1
+                removed.append(node)
+            else:
+                kept.append(node)
+        self._link_sorted(kept)
+        for node in removed:
+            node.left_child = node.right_child = node.parent_node = None
+            node.next_duplicate = node.prev_duplicate = None
+            node.balance_factor = 0
+
+    def node_data(self, node):
+        return node.data
 
     def best_match(self, key):
         node = self.tree_root
@@ -179,15 +281,182 @@ class BalancedTree:
             return candidate.next_duplicate
         return candidate
 
-    def iterate(self, action):
-        def _walk(node):
-            if not node:
+    def last(self):
+        node = self.tree_root
+        if not node:
+            return None
+        while node.right_child:
+            node = node.right_child
+        return node
+
+    def height(self):
+        height = 0
+        node = self.tree_root
+        while node:
+            height += 1
+            node = node.right_child if node.balance_factor > 0 else node.left_child
+        return height
+
+    def items_in_range(self, lo=None, hi=None):
+        stack = []
+        node = self.tree_root
+        while node:
+            if lo is None or node.val >= lo:
+                stack.append(node)
+                node = node.left_child
+            else:
+                node = node.right_child
+        while stack:
+            node = stack.pop()
+            if hi is not None and node.val >= hi:
                 return
-            _walk(node.left_child)
-            action(node, False)
-            dup = node.next_duplicate
+            dup = node
             while dup:
-                action(dup, True)
+                yield dup
                 dup = dup.next_duplicate
-            _walk(node.right_child)
-        _walk(self.tree_root)
+            node = node.right_child
+            while node:
+                stack.append(node)
+                node = node.left_child
+
+    def __iter__(self):
+        return self.items_in_range()
+
+    def reverse_iter(self):
+        stack = []
+        node = self.tree_root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.right_child
+            node = stack.pop()
+            dup = node
+            while dup:
+                yield dup
+                dup = dup.next_duplicate
+            node = node.left_child
+
+    def iterate(self, action):
+        for node in self:
+            action(node, node.prev_duplicate is not None)
+
+class AugmentedNode(TreeNode):
+    def __init__(self, val, data=None):
+        super().__init__(val, data)
+        self.copies = 1
+        self.count = 1
+        self.total = val
+
+def subtree_count(node):
+    return node.count if node else 0
+
+def subtree_total(node):
+    return node.total if node else 0
+
+class AugmentedTree(BalancedTree):
+    node_class = AugmentedNode
+
+    def _pull(self, node):
+        node.count = node.copies + subtree_count(node.left_child) + subtree_count(node.right_child)
+        node.total = node.val * node.copies + subtree_total(node.left_child) + subtree_total(node.right_child)
+
+    def _pull_path(self, node):
+        while node:
+            self._pull(node)
+            node = node.parent_node
+
+    def left_rotate(self, pivot):
+        super().left_rotate(pivot)
+        self._pull(pivot)
+        self._pull(pivot.parent_node)
+
+    def right_rotate(self, pivot):
+        super().right_rotate(pivot)
+        self._pull(pivot)
+        self._pull(pivot.parent_node)
+
+    def add_node(self, key, data=None):
+        node = super().add_node(key, data)
+        if node.prev_duplicate:
+            node.prev_duplicate.copies += 1
+            self._pull_path(node.prev_duplicate)
+        else:
+            self._pull_path(node)
+        return node
+
+    def remove_node(self, node):
+        if node.prev_duplicate:
+            start = node.prev_duplicate
+            while start.prev_duplicate:
+                start = start.prev_duplicate
+            start.copies -= 1
+        elif node.next_duplicate:
+            start = node.next_duplicate
+            start.copies = node.copies - 1
+        elif node.left_child and node.right_child:
+            start = node.right_child
+            while start.left_child:
+                start = start.left_child
+            if start.parent_node is not node:
+                start = start.parent_node
+        else:
+            start = node.parent_node
+        super().remove_node(node)
+        node.copies = node.count = 1
+        node.total = node.val
+        self._pull_path(start)
+
+    def _link_sorted(self, nodes):
+        super()._link_sorted(nodes)
+        stack = [(self.tree_root, False)] if self.tree_root else []
+        while stack:
+            node, ready = stack.pop()
+            if ready:
+                node.copies = 1
+                dup = node.next_duplicate
+                while dup:
+                    node.copies += 1
+                    dup.copies = dup.count = 1
+                    dup.total = dup.val
+                    dup = dup.next_duplicate
+                self._pull(node)
+                continue
+            stack.append((node, True))
+            for child in (node.left_child, node.right_child):
+                if child:
+                    stack.append((child, False))
+
+    def count_at_least(self, key):
+        result = 0
+        node = self.tree_root
+        while node:
+            if node.val >= key:
+                result += node.copies + subtree_count(node.right_child)
+                node = node.left_child
+            else:
+                node = node.right_child
+        return result
+
+    def total_at_least(self, key):
+        result = 0
+        node = self.tree_root
+        while node:
+            if node.val >= key:
+                result += node.val * node.copies + subtree_total(node.right_child)
+                node = node.left_child
+            else:
+                node = node.right_child
+        return result
+
+    def kth_largest(self, k):
+        node = self.tree_root
+        while node:
+            right = subtree_count(node.right_child)
+            if k <= right:
+                node = node.right_child
+            elif k <= right + node.copies:
+                return node
+            else:
+                k -= right + node.copies
+                node = node.left_child
+        return None
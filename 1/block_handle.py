@@ -0,0 +1,35 @@
+class BlockHandle:
+    __slots__ = ('_view', 'generations', 'key', 'generation')
+
+    def __init__(self, view, generations, key):
+        self._view = view
+        self.generations = generations
+        self.key = key
+        self.generation = generations.get(key, 0)
+
+    @property
+    def alive(self):
+        return self.generations.get(self.key, 0) == self.generation
+
+    @property
+    def view(self):
+        if not self.alive:
+            raise ValueError("Дескриптор блоку застарів")
+        return self._view
+
+    def __len__(self):
+        return len(self.view)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.view[index].tobytes()
+        return self.view[index]
+
+    def __setitem__(self, index, value):
+        self.view[index] = value
+
+    def tobytes(self):
+        return self.view.tobytes()
+
+def bump_generation(generations, key):
+    generations[key] = generations.get(key, 0) + 1
@@ -1,39 +1,74 @@
-class DataBlock:
-    def __init__(self, size, prev_size=0, start_addr=0, used=False, terminal=False):
-        self.size = size
-        self.prev_size = prev_size
-        self.start_addr = start_addr
-        self.used = used
-        self.terminal = terminal
-
-def divide_block(segment, amount, META=24, MIN=16):
-    segment.used = True
-    remain = segment.size - amount
+FLAG_USED = 1
+FLAG_TERMINAL = 2
+FLAG_MASK = 7
+SIZE_MASK = ~FLAG_MASK
+
+def write_header(words, offset, size, prev_size=0, flags=0, length=0):
+    idx = offset >> 3
+    words[idx] = size | flags
+    words[idx + 1] = prev_size
+    words[idx + 2] = length
+
+def block_size(words, offset):
+    return words[offset >> 3] & SIZE_MASK
+
+def block_used(words, offset):
+    return words[offset >> 3] & FLAG_USED
+
+def block_terminal(words, offset):
+    return words[offset >> 3] & FLAG_TERMINAL
+
+def block_prev_size(words, offset):
+    return words[(offset >> 3) + 1]
+
+def mark_free(words, offset):
+    words[offset >> 3] &= ~FLAG_USED
+
+def next_block(words, offset, META=24):
+    head = words[offset >> 3]
+    if head & FLAG_TERMINAL:
+        return None
+    return offset + META + (head & SIZE_MASK)
+
+def prev_block(words, offset, META=24):
+    if offset == 0:
+        return None
+    return offset - META - words[(offset >> 3) + 1]
+
+def divide_block(words, offset, amount, META=24, MIN=16):
+    idx = offset >> 3
+    head = words[idx] | FLAG_USED
+    remain = (head & SIZE_MASK) - amount
     if remain >= META + MIN:
         remain -= META
-        segment.size = amount
-        new_seg = DataBlock(remain)
-        new_seg.start_addr = segment.start_addr + amount + META
-        new_seg.prev_size = amount
-        new_seg.terminal = segment.terminal
-        if segment.terminal:
-            segment.terminal = False
-        return new_seg
+        rest = offset + amount + META
+        words[idx] = amount | FLAG_USED
+        write_header(words, rest, remain, amount, head & FLAG_TERMINAL)
+        if not head & FLAG_TERMINAL:
+            words[((rest + META + remain) >> 3) + 1] = remain
+        return rest
+    words[idx] = head
     return None
 
-def combine_blocks(base, target, META=24):
-    base.size += target.size + META
-    if target.terminal:
-        base.terminal = True
-
-def hint_unused(segment, PAGE=4096, META=24, NODE_SIZE=16):
-    if (segment.size - NODE_SIZE) < PAGE:
-        return
-    addr_start = segment.start_addr
-    page_start = (addr_start + META + NODE_SIZE + PAGE - 1) & ~(PAGE - 1)
-    page_end = (addr_start + segment.size + META) & ~(PAGE - 1)
+def combine_blocks(words, base, target, META=24):
+    idx = base >> 3
+    target_head = words[target >> 3]
+    size = (words[idx] & SIZE_MASK) + (target_head & SIZE_MASK) + META
+    words[idx] = size | (words[idx] & FLAG_USED) | (target_head & FLAG_TERMINAL)
+    if not target_head & FLAG_TERMINAL:
+        words[((base + META + size) >> 3) + 1] = size
+    return size
+
+def hint_unused(pages, offset, size, PAGE=4096, META=24, NODE_SIZE=16):
+    if (size - NODE_SIZE) < PAGE:
+        return None
+    page_start = (offset + META + NODE_SIZE + PAGE - 1) & ~(PAGE - 1)
+    page_end = (offset + size + META) & ~(PAGE - 1)
     if page_start == page_end:
-        return
-    dummy = bytearray(page_end - page_start)
-    from kernel_core import reset_area
-    reset_area(dummy, len(dummy))
+        return None
+    from kernel_core import release_pages, reset_area
+    zeroed = release_pages(pages, page_end - page_start, page_start)
+    if zeroed is None:
+        reset_area(pages, page_end - page_start, page_start)
+        return None
+    return page_start, page_end, zeroed
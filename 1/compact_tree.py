@@ -0,0 +1,310 @@
+from array import array
+from avl_tree import BalancedTree
+
+NIL = 0
+
+class SlotTreeNode:
+    __slots__ = ('val', 'data', 'left_child', 'right_child', 'parent_node',
+                 'balance_factor', 'next_duplicate', 'prev_duplicate')
+
+    def __init__(self, val, data=None):
+        self.val = val
+        self.data = data
+        self.left_child = None
+        self.right_child = None
+        self.parent_node = None
+        self.balance_factor = 0
+        self.next_duplicate = None
+        self.prev_duplicate = None
+
+class SlotBalancedTree(BalancedTree):
+    node_class = SlotTreeNode
+
+class CompactTree:
+    def __init__(self):
+        self.keys = array('q', [0])
+        self.left = array('q', [NIL])
+        self.right = array('q', [NIL])
+        self.parent = array('q', [NIL])
+        self.balance = array('q', [0])
+        self.next_dup = array('q', [NIL])
+        self.prev_dup = array('q', [NIL])
+        self.payload = [None]
+        self.free_head = NIL
+        self.tree_root = NIL
+
+    def _new_node(self, key, data):
+        node = self.free_head
+        if node:
+            self.free_head = self.next_dup[node]
+            self.keys[node] = key
+            self.left[node] = self.right[node] = self.parent[node] = NIL
+            self.next_dup[node] = self.prev_dup[node] = NIL
+            self.balance[node] = 0
+            self.payload[node] = data
+            return node
+        node = len(self.keys)
+        self.keys.append(key)
+        for column in (self.left, self.right, self.parent, self.balance, self.next_dup, self.prev_dup):
+            column.append(0)
+        self.payload.append(data)
+        return node
+
+    def _release_node(self, node):
+        self.payload[node] = None
+        self.next_dup[node] = self.free_head
+        self.free_head = node
+
+    def key(self, node):
+        return self.keys[node]
+
+    def node_data(self, node):
+        return self.payload[node]
+
+    def _locate(self, key):
+        keys, left, right = self.keys, self.left, self.right
+        node = self.tree_root
+        parent = NIL
+        go_left = False
+        while node:
+            parent = node
+            if key < keys[node]:
+                go_left = True
+                node = left[node]
+            elif key > keys[node]:
+                go_left = False
+                node = right[node]
+            else:
+                return node, parent, go_left
+        return NIL, parent, go_left
+
+    def _replace_child(self, node, new_node):
+        parent = self.parent[node]
+        if not parent:
+            self.tree_root = new_node
+        elif self.left[parent] == node:
+            self.left[parent] = new_node
+        else:
+            self.right[parent] = new_node
+        if new_node:
+            self.parent[new_node] = parent
+
+    def left_rotate(self, pivot):
+        left, right, parent, balance = self.left, self.right, self.parent, self.balance
+        r = right[pivot]
+        right[pivot] = left[r]
+        if left[r]:
+            parent[left[r]] = pivot
+        self._replace_child(pivot, r)
+        left[r] = pivot
+        parent[pivot] = r
+        balance[pivot] = balance[pivot] - 1 - max(balance[r], 0)
+        balance[r] = balance[r] - 1 + min(balance[pivot], 0)
+
+    def right_rotate(self, pivot):
+        left, right, parent, balance = self.left, self.right, self.parent, self.balance
+        l = left[pivot]
+        left[pivot] = right[l]
+        if right[l]:
+            parent[right[l]] = pivot
+        self._replace_child(pivot, l)
+        right[l] = pivot
+        parent[pivot] = l
+        balance[pivot] = balance[pivot] + 1 - min(balance[l], 0)
+        balance[l] = balance[l] + 1 + max(balance[pivot], 0)
+
+    def _rebalance(self, node):
+        balance = self.balance
+        if balance[node] == -2:
+            if balance[self.left[node]] <= 0:
+                self.right_rotate(node)
+            else:
+                self.left_rotate(self.left[node])
+                self.right_rotate(node)
+        elif balance[node] == 2:
+            if balance[self.right[node]] >= 0:
+                self.left_rotate(node)
+            else:
+                self.right_rotate(self.right[node])
+                self.left_rotate(node)
+
+    def update_balance_insert(self, node):
+        balance, parents = self.balance, self.parent
+        parent = parents[node]
+        while parent:
+            if node == self.left[parent]:
+                balance[parent] -= 1
+            else:
+                balance[parent] += 1
+            if balance[parent] == 0:
+                break
+            if abs(balance[parent]) == 2:
+                self._rebalance(parent)
+                break
+            node, parent = parent, parents[parent]
+
+    def add_node(self, key, data=None):
+        found, parent, go_left = self._locate(key)
+        node = self._new_node(key, data)
+        if found:
+            following = self.next_dup[found]
+            self.next_dup[node] = following
+            self.prev_dup[node] = found
+            self.next_dup[found] = node
+            if following:
+                self.prev_dup[following] = node
+            return node
+        self.parent[node] = parent
+        if not parent:
+            self.tree_root = node
+        elif go_left:
+            self.left[parent] = node
+        else:
+            self.right[parent] = node
+        self.update_balance_insert(node)
+        return node
+
+    def _update_balance_remove(self, node, removed_left):
+        balance, parents = self.balance, self.parent
+        while node:
+            parent = parents[node]
+            parent_left = bool(parent) and node == self.left[parent]
+            balance[node] += 1 if removed_left else -1
+            if abs(balance[node]) == 1:
+                break
+            if abs(balance[node]) == 2:
+                sibling = self.right[node] if balance[node] == 2 else self.left[node]
+                sibling_balance = balance[sibling]
+                self._rebalance(node)
+                if sibling_balance == 0:
+                    break
+            node, removed_left = parent, parent_left
+
+    def _take_place(self, node, successor):
+        left, right = self.left[node], self.right[node]
+        self.left[successor] = left
+        self.right[successor] = right
+        self.balance[successor] = self.balance[node]
+        if left:
+            self.parent[left] = successor
+        if right:
+            self.parent[right] = successor
+        self._replace_child(node, successor)
+
+    def remove_node(self, node):
+        next_dup, prev_dup = self.next_dup, self.prev_dup
+        if prev_dup[node]:
+            next_dup[prev_dup[node]] = next_dup[node]
+            if next_dup[node]:
+                prev_dup[next_dup[node]] = prev_dup[node]
+        elif next_dup[node]:
+            successor = next_dup[node]
+            prev_dup[successor] = NIL
+            self._take_place(node, successor)
+        elif self.left[node] and self.right[node]:
+            successor = self.right[node]
+            while self.left[successor]:
+                successor = self.left[successor]
+            if self.parent[successor] == node:
+                fix_from, removed_left = successor, False
+                right = self.right[successor]
+                self._take_place(node, successor)
+                self.right[successor] = right
+            else:
+                fix_from, removed_left = self.parent[successor], True
+                self._replace_child(successor, self.right[successor])
+                self._take_place(node, successor)
+            self._update_balance_remove(fix_from, removed_left)
+        else:
+            child = self.left[node] or self.right[node]
+            parent = self.parent[node]
+            removed_left = bool(parent) and node == self.left[parent]
+            self._replace_child(node, child)
+            if parent:
+                self._update_balance_remove(parent, removed_left)
+        self._release_node(node)
+
+    def delete_node(self, key):
+        node, _, _ = self._locate(key)
+        if node:
+            self.remove_node(node)
+
+    def best_match(self, key):
+        keys, left, right = self.keys, self.left, self.right
+        node = self.tree_root
+        candidate = NIL
+        while node:
+            if keys[node] == key:
+                candidate = node
+                break
+            elif keys[node] < key:
+                node = right[node]
+            else:
+                candidate = node
+                node = left[node]
+        if not candidate:
+            return None
+        if self.next_dup[candidate]:
+            return self.next_dup[candidate]
+        return candidate
+
+    def last(self):
+        node = self.tree_root
+        if not node:
+            return None
+        while self.right[node]:
+            node = self.right[node]
+        return node
+
+    def height(self):
+        height = 0
+        node = self.tree_root
+        while node:
+            height += 1
+            node = self.right[node] if self.balance[node] > 0 else self.left[node]
+        return height
+
+    def items_in_range(self, lo=None, hi=None):
+        keys, left, right, next_dup = self.keys, self.left, self.right, self.next_dup
+        stack = []
+        node = self.tree_root
+        while node:
+            if lo is None or keys[node] >= lo:
+                stack.append(node)
+                node = left[node]
+            else:
+                node = right[node]
+        while stack:
+            node = stack.pop()
+            if hi is not None and keys[node] >= hi:
+                return
+            dup = node
+            while dup:
+                yield dup
+                dup = next_dup[dup]
+            node = right[node]
+            while node:
+                stack.append(node)
+                node = left[node]
+
+    def __iter__(self):
+        return self.items_in_range()
+
+    def reverse_iter(self):
+        left, right, next_dup = self.left, self.right, self.next_dup
+        stack = []
+        node = self.tree_root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = right[node]
+            node = stack.pop()
+            dup = node
+            while dup:
+                yield dup
+                dup = next_dup[dup]
+            node = left[node]
+
+    def iterate(self, action):
+        for node in self:
+            action(node, self.prev_dup[node] != NIL)
@@ -0,0 +1,20 @@
+PAGE_SIZE = 4096
+ARENA_PAGES = 16
+META = 24
+MIN_BLOCK = 16
+ALIGN = 8
+SLAB_PAGES = 4
+SLAB_LIMIT = 512
+SLAB_CLASSES = (16, 32, 48, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384, 448, 512)
+RESET_MODE = 'poison'
+RELEASE_ADVICE = 'dontneed'
+SPARE_ARENAS = 1
+LARGE_LIMIT = 32768
+PLACEMENT = 'best_fit'
+DEFERRED_LIMIT = 0
+POISON_FREED = False
+THREAD_SAFE = False
+THREAD_CACHE_LIMIT = 64
+THREAD_CACHE_BATCH = 32
+CHECK_HASH = 'crc32'
+SEED = 2025
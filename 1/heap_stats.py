@@ -0,0 +1,49 @@
+import json
+import time
+import threading
+from collections import deque
+
+class StatsExporter:
+    def __init__(self, heap, interval=1.0, history=60, path=None, thresholds=()):
+        self.heap = heap
+        self.thresholds = thresholds
+        self.interval = interval
+        self.history = deque(maxlen=history)
+        self.path = path
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        stats = self.heap.stats()
+        if self.thresholds:
+            stats['free_at_least'] = {}
+            for size in self.thresholds:
+                blocks, total = self.heap.free_at_least(size)
+                stats['free_at_least'][size] = {'blocks': blocks, 'bytes': total}
+        stats['timestamp'] = time.time()
+        self.history.append(stats)
+        if self.path:
+            with open(self.path, 'a') as out:
+                out.write(json.dumps(stats) + '\n')
+        return stats
+
+    def latest(self):
+        return self.history[-1] if self.history else None
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
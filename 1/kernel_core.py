@@ -1,15 +1,52 @@
 import mmap
+import errno
+import ctypes
+import config
+
+RESET_POISON = 'poison'
+RESET_ZERO = 'zero'
+RESET_DISCARD = 'discard'
 
 def get_pages(length):
-    return mmap.mmap(-1, length)
+    try:
+        if hasattr(mmap, 'MAP_PRIVATE'):
+            return mmap.mmap(-1, length, flags=mmap.MAP_PRIVATE)
+        return mmap.mmap(-1, length)
+    except OSError as e:
+        if e.errno == errno.ENOMEM:
+            return None
+        raise
+
+def map_file(source, length, offset=0):
+    return mmap.mmap(source.fileno(), length, access=mmap.ACCESS_COPY, offset=offset)
 
 def return_pages(obj, length):
     obj.close()
 
-def reset_area(obj, length):
-    if isinstance(obj, bytearray):
-        for i in range(length):
-            obj[i] = 0x7e
+def release_pages(obj, length, offset=0):
+    advice = getattr(mmap, 'MADV_FREE', None) if config.RELEASE_ADVICE == 'free' else None
+    zeroed = advice is None
+    if advice is None:
+        advice = getattr(mmap, 'MADV_DONTNEED', None)
+    if advice is None or not isinstance(obj, mmap.mmap):
+        return None
+    obj.madvise(advice, offset, length)
+    return zeroed
+
+def _fill_area(obj, length, offset, value):
+    area = (ctypes.c_char * length).from_buffer(obj, offset)
+    ctypes.memset(ctypes.addressof(area), value, length)
+    del area
+
+def reset_area(obj, length, offset=0, mode=None):
+    if length <= 0:
+        return
+    mode = mode or config.RESET_MODE
+    if isinstance(obj, (bytearray, mmap.mmap)):
+        if mode == RESET_DISCARD and isinstance(obj, mmap.mmap) and hasattr(mmap, 'MADV_DONTNEED'):
+            obj.madvise(mmap.MADV_DONTNEED, offset, length)
+        else:
+            _fill_area(obj, length, offset, 0x7e if mode == RESET_POISON else 0)
     elif hasattr(obj, 'seek') and hasattr(obj, 'write'):
-        obj.seek(0)
+        obj.seek(offset)
         obj.write(b'\x7e' * length)
@@ -1,9 +1,7 @@
 import sys
-import time
 import random
-import logging
+import config
 from memory_ctrl import MemoryController
-from memory_checker import run_memory_tests
 
 def init_data(length):
     d = MemoryController.alloc_bytes(length)
@@ -12,13 +10,13 @@ def init_data(length):
             d[i] = random.getrandbits(8)
     return d
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(levelname)s - %(message)s",
-    datefmt="%M:%S"
-)
-
 def demo_app():
+    import logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(levelname)s - %(message)s",
+        datefmt="%M:%S"
+    )
     logger = logging.getLogger(__name__)
 
     logger.info("Ініціалізація демонстрації керування пам'яттю")
@@ -49,21 +47,53 @@ def demo_app():
     MemoryController.display_status("Стан після зміни розміру блоку4")
 
 def tests_app():
-    random.seed(int(time.time()))
+    from memory_checker import run_memory_tests
+    random.seed(config.SEED)
     run_memory_tests(verbose=True)
 
+def threads_app():
+    from memory_checker import run_threaded_tests
+    random.seed(config.SEED)
+    run_threaded_tests(4, verbose=True)
+
+def bench_app(trace_path=None):
+    from alloc_bench import run_benchmarks
+    run_benchmarks(trace_path=trace_path)
+
+def record_app(trace_path):
+    from memory_checker import run_memory_tests
+    random.seed(config.SEED)
+    MemoryController.start_recording(trace_path)
+    try:
+        run_memory_tests(verbose=False)
+    finally:
+        MemoryController.stop_recording()
+
+def profile_app():
+    from startup_profile import report_startup
+    report_startup()
+
 def usage():
-    print("Режими використання:\n\tdemo — демонстрація роботи пам'яті ($ python main_app.py demo)\n\trun - запустити тестування ($ python main_app.py run)")
+    print("Режими використання:\n\tdemo — демонстрація роботи пам'яті ($ python main_app.py demo)\n\trun - запустити тестування ($ python main_app.py run)\n\tthreads - багатопотокове тестування ($ python main_app.py threads)\n\tbench - порівняльний бенчмарк алокаторів ($ python main_app.py bench [трасування])\n\trecord - записати трасування тестування ($ python main_app.py record <файл>)\n\t--profile-startup - час імпорту модулів і першого виділення ($ python main_app.py --profile-startup)")
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
+    if len(sys.argv) not in (2, 3):
         usage()
         sys.exit(1)
     cmd = sys.argv[1].lower()
+    arg = sys.argv[2] if len(sys.argv) == 3 else None
     if cmd == 'demo':
         demo_app()
     elif cmd == 'run':
         tests_app()
+    elif cmd == 'threads':
+        threads_app()
+    elif cmd == 'bench':
+        bench_app(arg)
+    elif cmd == 'record' and arg:
+        record_app(arg)
+    elif cmd == '--profile-startup' and arg is None:
+        profile_app()
     else:
         usage()
         sys.exit(1)
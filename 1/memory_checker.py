@@ -1,6 +1,13 @@
 import random
 import time
+import threading
+import zlib
+import ctypes
+import hashlib
+import bisect
+import config
 from memory_ctrl import MemoryController
+from thread_cache import ThreadCachedAllocator
 
 class SegmentData:
     def __init__(self):
@@ -8,15 +15,50 @@ class SegmentData:
         self.data_length = 0
         self.data_hash = 0
 
-def compute_hash(data, size):
+numpy = None
+
+def legacy_hash(data, size):
     result = 0
     for i in range(size):
         result = ((result << 3) ^ (result >> 5)) ^ data[i]
     return result
 
+def crc32_hash(data, size):
+    return zlib.crc32(data[:size])
+
+def blake2b_hash(data, size):
+    return int.from_bytes(hashlib.blake2b(data[:size], digest_size=8).digest(), 'little')
+
+def numpy_hash(data, size):
+    values = numpy.frombuffer(data, dtype=numpy.uint8, count=size).astype(numpy.uint64)
+    weighted = values * numpy.arange(1, size + 1, dtype=numpy.uint64)
+    return (int(weighted.sum()) << 32) ^ int(values.sum())
+
+HASHES = {
+    'legacy': legacy_hash,
+    'crc32': crc32_hash,
+    'blake2b': blake2b_hash,
+    'numpy': numpy_hash,
+}
+
+def set_hash_mode(name):
+    global hash_impl, numpy
+    if name not in HASHES:
+        raise ValueError("Невідомий режим хешування: {}".format(name))
+    if name == 'numpy' and numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ValueError("Режим numpy потребує встановленого numpy")
+    hash_impl = HASHES[name]
+
+set_hash_mode(config.CHECK_HASH)
+
+def compute_hash(data, size):
+    return hash_impl(data, size)
+
 def fill_data(data, size):
-    for i in range(size):
-        data[i] = random.getrandbits(8)
+    data[:size] = random.randbytes(size)
 
 def alloc_and_fill(size):
     mem = MemoryController.alloc_bytes(size)
@@ -31,6 +73,55 @@ def check_integrity(pool, amount):
             return False
     return True
 
+def buffer_address(data):
+    anchor = ctypes.c_char.from_buffer(data)
+    address = ctypes.addressof(anchor)
+    del anchor
+    return address
+
+class IntegrityTracker:
+    def __init__(self, pool, sweep_every):
+        self.pool = pool
+        self.sweep_every = sweep_every
+        self.order = []
+        self.addresses = {}
+        self.dirty = set()
+        self.steps = 0
+
+    def _mark_neighbours(self, pos):
+        if pos > 0:
+            self.dirty.add(self.order[pos - 1][1])
+        if pos < len(self.order):
+            self.dirty.add(self.order[pos][1])
+
+    def track(self, idx):
+        if self.pool[idx].data_buffer is None:
+            return
+        address = buffer_address(self.pool[idx].data_buffer)
+        pos = bisect.bisect_left(self.order, (address, idx))
+        self._mark_neighbours(pos)
+        self.order.insert(pos, (address, idx))
+        self.addresses[idx] = address
+        self.dirty.add(idx)
+
+    def forget(self, idx):
+        address = self.addresses.pop(idx, None)
+        if address is None:
+            return
+        pos = bisect.bisect_left(self.order, (address, idx))
+        del self.order[pos]
+        self._mark_neighbours(pos)
+        self.dirty.discard(idx)
+
+    def verify(self):
+        self.steps += 1
+        if self.steps % self.sweep_every == 0:
+            self.dirty.clear()
+            return check_integrity(self.pool, len(self.pool))
+        items = [self.pool[idx] for idx in self.dirty]
+        self.dirty.clear()
+        return check_integrity(items, len(items))
+
 def create_segment(entry, verbose, MIN_SIZE, MAX_SIZE):
     lgt = random.randint(MIN_SIZE, MAX_SIZE - 1)
     if verbose:
@@ -85,27 +176,61 @@ def free_segment(entry, verbose):
     MemoryController.free_bytes(entry.data_buffer)
     entry.data_buffer = None
 
-def run_memory_tests(verbose):
-    TOTAL = 100
+def run_memory_tests(verbose, total=100, iterations=1000, incremental=False, sweep_every=100):
+    TOTAL = total
     MIN_SIZE = 1
     MAX_SIZE = 4094 * 10
-    ITERATIONS = 1000
+    ITERATIONS = iterations
     pool = [SegmentData() for _ in range(TOTAL)]
+    tracker = IntegrityTracker(pool, sweep_every) if incremental else None
     for _ in range(ITERATIONS):
         if verbose:
             MemoryController.display_status("------------------------")
-        if not check_integrity(pool, TOTAL):
-            return
+        if tracker:
+            if not tracker.verify():
+                return False
+        elif not check_integrity(pool, TOTAL):
+            return False
         idx = random.randint(0, TOTAL - 1)
         if pool[idx].data_buffer is None:
             create_segment(pool[idx], verbose, MIN_SIZE, MAX_SIZE)
+            if tracker:
+                tracker.track(idx)
         elif random.getrandbits(1):
+            if tracker:
+                tracker.forget(idx)
             if not adjust_segment(pool[idx], verbose, MIN_SIZE, MAX_SIZE):
-                return
+                return False
+            if tracker:
+                tracker.track(idx)
         else:
+            if tracker:
+                tracker.forget(idx)
             free_segment(pool[idx], verbose)
     if not check_final(pool, TOTAL):
-        return
+        return False
     free_all(pool, TOTAL)
     if verbose:
         MemoryController.display_status("------------------------")
+    return True
+
+def run_threaded_tests(workers, verbose):
+    if not isinstance(MemoryController.heap, ThreadCachedAllocator):
+        MemoryController.heap = ThreadCachedAllocator(MemoryController.heap)
+    heap = MemoryController.heap
+    results = []
+    def worker():
+        results.append(run_memory_tests(False))
+        heap.flush()
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stats = heap.stats()
+    if verbose:
+        print("Потоків: {}, час: {:.3f} с".format(workers, elapsed))
+        print("Захоплень блокування: {}, з очікуванням: {}".format(stats['lock_acquired'], stats['lock_contended']))
+    return all(results)
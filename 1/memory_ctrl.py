@@ -1,20 +1,82 @@
-import random
+import config
+from arena_allocator import ArenaAllocator
+from block_handle import BlockHandle
+
+def wrap_heap(heap):
+    if not config.THREAD_SAFE:
+        return heap
+    from thread_cache import ThreadCachedAllocator
+    return ThreadCachedAllocator(heap)
 
 class MemoryController:
+    heap = wrap_heap(ArenaAllocator())
+    recorder = None
     @staticmethod
     def alloc_bytes(length):
-        return bytearray(random.getrandbits(8) for _ in range(length))
+        data = MemoryController.heap.alloc(length)
+        if MemoryController.recorder:
+            MemoryController.recorder.on_alloc(data, length)
+        return data
+    @staticmethod
+    def alloc_handle(length):
+        data = MemoryController.alloc_bytes(length)
+        return None if data is None else MemoryController.heap.handle(data)
     @staticmethod
     def change_size(data, new_length):
-        new_data = bytearray(data)
-        if len(new_data) < new_length:
-            new_data.extend(bytearray(new_length - len(new_data)))
-        else:
-            new_data = new_data[:new_length]
+        if isinstance(data, BlockHandle):
+            new_data = MemoryController.change_size(data.view, new_length)
+            return None if new_data is None else MemoryController.heap.handle(new_data)
+        new_data = MemoryController.heap.realloc(data, new_length)
+        if MemoryController.recorder:
+            MemoryController.recorder.on_realloc(data, new_data, new_length)
         return new_data
     @staticmethod
     def free_bytes(data):
-        pass
+        if isinstance(data, BlockHandle):
+            data = data.view
+        if MemoryController.recorder:
+            MemoryController.recorder.on_free(data)
+        MemoryController.heap.free(data)
+    @staticmethod
+    def alloc_many(lengths):
+        buffers = MemoryController.heap.alloc_many(lengths)
+        if MemoryController.recorder:
+            for data, length in zip(buffers, lengths):
+                MemoryController.recorder.on_alloc(data, length)
+        return buffers
+    @staticmethod
+    def free_many(buffers):
+        if MemoryController.recorder:
+            for data in buffers:
+                MemoryController.recorder.on_free(data)
+        MemoryController.heap.free_many(buffers)
+    @staticmethod
+    def idle():
+        MemoryController.heap.idle()
+    @staticmethod
+    def address(data):
+        return MemoryController.heap.address(data)
+    @staticmethod
+    def save_heap(path):
+        MemoryController.heap.snapshot(path)
+    @staticmethod
+    def load_heap(path):
+        heap, buffers = ArenaAllocator.restore(path)
+        MemoryController.heap = wrap_heap(heap)
+        return buffers
     @staticmethod
     def display_status(msg):
-        print(msg)
+        MemoryController.heap.show(msg)
+    @staticmethod
+    def heap_stats():
+        return MemoryController.heap.stats()
+    @staticmethod
+    def start_recording(path):
+        from alloc_trace import TraceRecorder
+        MemoryController.stop_recording()
+        MemoryController.recorder = TraceRecorder(path)
+    @staticmethod
+    def stop_recording():
+        if MemoryController.recorder:
+            MemoryController.recorder.close()
+            MemoryController.recorder = None
@@ -0,0 +1,108 @@
+from bisect import bisect_left
+from avl_tree import BalancedTree, AugmentedTree
+from tlsf_index import TlsfIndex
+
+class AddressOrderedTree(BalancedTree):
+    def add_node(self, key, data=None):
+        return super().add_node((key, data), data)
+
+    def delete_node(self, key):
+        node = self.best_match(key)
+        if node and node.val[0] == key:
+            self.remove_node(node)
+
+    def best_match(self, key):
+        return super().best_match((key, -1))
+
+    def add_many(self, keys, payloads):
+        return [self.add_node(key, data) for key, data in zip(keys, payloads)]
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.delete_node(key)
+
+class FitNode:
+    __slots__ = ('val', 'addr', 'data')
+
+    def __init__(self, val, addr, data=None):
+        self.val = val
+        self.addr = addr
+        self.data = data
+
+class FirstFitIndex:
+    def __init__(self):
+        self.addrs = []
+        self.sizes = []
+        self.nodes = []
+
+    def add_node(self, key, data=None):
+        node = FitNode(key, data, data)
+        idx = bisect_left(self.addrs, node.addr)
+        self.addrs.insert(idx, node.addr)
+        self.sizes.insert(idx, key)
+        self.nodes.insert(idx, node)
+        return node
+
+    def remove_node(self, node):
+        idx = bisect_left(self.addrs, node.addr)
+        del self.addrs[idx]
+        del self.sizes[idx]
+        del self.nodes[idx]
+
+    def delete_node(self, key):
+        if key in self.sizes:
+            self.remove_node(self.nodes[self.sizes.index(key)])
+
+    def node_data(self, node):
+        return node.data
+
+    def _scan(self, key, start, stop):
+        sizes = self.sizes
+        for idx in range(start, stop):
+            if sizes[idx] >= key:
+                return idx
+        return -1
+
+    def best_match(self, key):
+        idx = self._scan(key, 0, len(self.sizes))
+        return self.nodes[idx] if idx >= 0 else None
+
+    def last(self):
+        if not self.sizes:
+            return None
+        return self.nodes[self.sizes.index(max(self.sizes))]
+
+    def height(self):
+        return 0
+
+    def __iter__(self):
+        return iter(list(self.nodes))
+
+class NextFitIndex(FirstFitIndex):
+    def __init__(self):
+        super().__init__()
+        self.rover = 0
+
+    def best_match(self, key):
+        start = bisect_left(self.addrs, self.rover)
+        idx = self._scan(key, start, len(self.sizes))
+        if idx < 0:
+            idx = self._scan(key, 0, start)
+        if idx < 0:
+            return None
+        self.rover = self.addrs[idx]
+        return self.nodes[idx]
+
+PLACEMENTS = {
+    'best_fit': BalancedTree,
+    'augmented': AugmentedTree,
+    'address_fit': AddressOrderedTree,
+    'first_fit': FirstFitIndex,
+    'next_fit': NextFitIndex,
+    'tlsf': TlsfIndex,
+}
+
+def placement_index(name):
+    if name not in PLACEMENTS:
+        raise ValueError("Невідома стратегія розміщення: {}".format(name))
+    return PLACEMENTS[name]
@@ -0,0 +1,145 @@
+import config
+from kernel_core import get_pages, reset_area, RESET_POISON
+from block_handle import bump_generation
+
+class Slab:
+    def __init__(self, pages, size_class):
+        self.pages = pages
+        self.view = memoryview(pages)
+        self.size_class = size_class
+        self.slot_size = size_class.slot_size
+        self.used = 0
+        self.base = 0
+        self.generations = {}
+
+class SizeClass:
+    def __init__(self, slot_size):
+        self.slot_size = slot_size
+        self.slabs = []
+        self.free_slots = []
+
+class SlabCache:
+    def __init__(self, classes=config.SLAB_CLASSES, slab_pages=config.SLAB_PAGES):
+        self.classes = [SizeClass(size) for size in classes]
+        self.slab_size = slab_pages * config.PAGE_SIZE
+        self.limit = classes[-1]
+        self.class_index = []
+        current = 0
+        for size in range(0, self.limit + 1, 16):
+            while self.classes[current].slot_size < size:
+                current += 1
+            self.class_index.append(current)
+        self.live = {}
+        self.mapped_bytes = 0
+        self.used_bytes = 0
+        self.poison = False
+        self.next_base = None
+
+    def size_class(self, length):
+        if length > self.limit:
+            return None
+        return self.classes[self.class_index[(length + 15) >> 4]]
+
+    def _grow(self, size_class):
+        pages = get_pages(self.slab_size)
+        if pages is None:
+            return False
+        self._add_slab(Slab(pages, size_class))
+        return True
+
+    def _add_slab(self, slab, used=()):
+        size_class = slab.size_class
+        if self.next_base and not slab.base:
+            slab.base = self.next_base()
+        size_class.slabs.append(slab)
+        self.mapped_bytes += self.slab_size
+        count = self.slab_size // size_class.slot_size
+        for offset in range((count - 1) * size_class.slot_size, -1, -size_class.slot_size):
+            if offset not in used:
+                size_class.free_slots.append((slab, offset))
+
+    def live_slots(self):
+        slots = {}
+        for view, slab, offset in self.live.copy().values():
+            try:
+                length = len(view)
+            except ValueError:
+                continue
+            slots.setdefault(slab, []).append((offset, length))
+        return slots
+
+    def restore_slab(self, pages, base, slot_size, slots):
+        size_class = next((item for item in self.classes if item.slot_size == slot_size), None)
+        if size_class is None or len(pages) != self.slab_size:
+            raise ValueError("Знімок не відповідає налаштуванням slab-кешу")
+        count = self.slab_size // slot_size
+        for offset, length in slots:
+            if offset % slot_size or offset >= count * slot_size or length > slot_size:
+                raise ValueError("Пошкоджений знімок slab-блоку")
+        slab = Slab(pages, size_class)
+        slab.base = base
+        self._add_slab(slab, {offset for offset, _ in slots})
+        views = {}
+        for offset, length in slots:
+            slab.used += 1
+            self.used_bytes += slot_size
+            views[base + offset] = self.expose(slab, offset, length)
+        return views
+
+    def expose(self, slab, offset, length):
+        view = slab.view[offset:offset + length]
+        self.live[id(view)] = (view, slab, offset)
+        return view
+
+    def owns(self, data):
+        entry = self.live.get(id(data))
+        return entry is not None and entry[0] is data
+
+    def take(self, size_class, count):
+        slots = []
+        while len(slots) < count:
+            if not size_class.free_slots and not self._grow(size_class):
+                break
+            slab, offset = size_class.free_slots.pop()
+            slab.used += 1
+            self.used_bytes += slab.slot_size
+            slots.append((slab, offset))
+        return slots
+
+    def put(self, slots):
+        for slab, offset in slots:
+            slab.used -= 1
+            self.used_bytes -= slab.slot_size
+            slab.size_class.free_slots.append((slab, offset))
+
+    def detach(self, data):
+        _, slab, offset = self.live.pop(id(data))
+        data.release()
+        bump_generation(slab.generations, offset)
+        return slab, offset
+
+    def release_slot(self, data):
+        slab, offset = self.detach(data)
+        if self.poison:
+            reset_area(slab.pages, slab.slot_size, offset, RESET_POISON)
+        return slab, offset
+
+    def alloc(self, length):
+        size_class = self.size_class(length)
+        if size_class is None:
+            return None
+        slots = self.take(size_class, 1)
+        if not slots:
+            return None
+        slab, offset = slots[0]
+        return self.expose(slab, offset, length)
+
+    def resize(self, data, length):
+        _, slab, offset = self.live[id(data)]
+        if length > slab.slot_size:
+            return None
+        self.detach(data)
+        return self.expose(slab, offset, length)
+
+    def free(self, data):
+        self.put([self.release_slot(data)])
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import subprocess
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+LAZY_MODULES = ('alloc_bench', 'alloc_trace', 'heap_stats', 'memory_checker', 'thread_cache',
+                'logging', 'tempfile')
+
+FIRST_ALLOC = """import sys, time
+import main_app
+main_app.MemoryController.alloc_bytes(1)
+print(time.time_ns())
+print(','.join(name for name in {lazy!r} if name in sys.modules))
+"""
+
+def project_modules():
+    return {name[:-3] for name in os.listdir(APP_DIR) if name.endswith('.py')}
+
+def parse_importtime(lines):
+    entries = []
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, total, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(own), int(total), depth))
+    return entries
+
+def import_times(module='main_app'):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            cwd=APP_DIR, capture_output=True, text=True, check=True)
+    return parse_importtime(result.stderr.splitlines())
+
+def first_alloc_time():
+    start = time.time_ns()
+    result = subprocess.run([sys.executable, '-c', FIRST_ALLOC.format(lazy=LAZY_MODULES)],
+                            cwd=APP_DIR, capture_output=True, text=True, check=True)
+    stamp, loaded = result.stdout.splitlines()
+    return int(stamp) - start, [name for name in loaded.split(',') if name]
+
+def profile_startup(runs=5):
+    entries = min((import_times() for _ in range(runs)), key=lambda run: run[-1][2])
+    samples = [first_alloc_time() for _ in range(runs)]
+    return {
+        'modules': entries,
+        'import_us': entries[-1][2],
+        'first_alloc_ns': min(elapsed for elapsed, _ in samples),
+        'eager_modules': samples[0][1],
+    }
+
+def report_startup(runs=5, limit=20):
+    profile = profile_startup(runs)
+    own = project_modules()
+    print("{:<28} {:>12} {:>12}".format("Модуль", "власний, мс", "сумарний, мс"))
+    for name, own_us, total_us, _ in sorted(profile['modules'], key=lambda entry: -entry[2])[:limit]:
+        print("{:<28} {:>12.2f} {:>12.2f}".format(
+            ('* ' if name in own else '  ') + name, own_us / 1000, total_us / 1000))
+    print("Імпорт main_app: {:.2f} мс".format(profile['import_us'] / 1000))
+    print("Перше виділення від запуску процесу: {:.2f} мс".format(profile['first_alloc_ns'] / 1e6))
+    if profile['eager_modules']:
+        print("Завантажено під час старту: {}".format(', '.join(profile['eager_modules'])))
+    return profile
@@ -0,0 +1,688 @@
+import gc
+import os
+import json
+import time
+import random
+import tempfile
+import threading
+import weakref
+import unittest
+import config
+import alloc_bench
+import alloc_trace
+import arena_allocator
+import heap_stats
+import placement as placement_module
+import startup_profile
+import memory_checker
+from avl_tree import BalancedTree, AugmentedTree
+from compact_tree import CompactTree, SlotBalancedTree
+from tlsf_index import TlsfIndex
+from arena_allocator import ArenaAllocator, ARENA_SIZE, OFFSET_MASK
+from thread_cache import ThreadCachedAllocator
+from memory_ctrl import MemoryController
+from kernel_core import get_pages, reset_area, RESET_POISON, RESET_ZERO, RESET_DISCARD
+
+class TreeTestCases(unittest.TestCase):
+    def test_remove_keeps_order(self):
+        random.seed(1)
+        tree = BalancedTree()
+        nodes = [tree.add_node(random.randint(0, 50), i) for i in range(500)]
+        random.shuffle(nodes)
+        for node in nodes[:300]:
+            tree.remove_node(node)
+        keys = []
+        tree.iterate(lambda node, linked: keys.append(node.val))
+        self.assertEqual(keys, sorted(node.val for node in nodes[300:]))
+
+    def test_best_match(self):
+        tree = BalancedTree()
+        for key in (64, 16, 256, 32):
+            tree.add_node(key)
+        self.assertEqual(tree.best_match(20).val, 32)
+        self.assertEqual(tree.best_match(64).val, 64)
+        self.assertIsNone(tree.best_match(300))
+
+    def test_iterators(self):
+        tree = BalancedTree()
+        compact = CompactTree()
+        for key in (40, 10, 30, 10, 20, 50, 30):
+            tree.add_node(key)
+            compact.add_node(key)
+        for nodes, expected in ((tree, [10, 10, 20, 30, 30, 40, 50]),
+                                (tree.items_in_range(15, 40), [20, 30, 30]),
+                                (tree.reverse_iter(), [50, 40, 30, 30, 20, 10, 10])):
+            self.assertEqual([node.val for node in nodes], expected)
+        self.assertEqual([compact.key(node) for node in compact.items_in_range(15, 40)], [20, 30, 30])
+        self.assertEqual([compact.key(node) for node in compact.reverse_iter()], [50, 40, 30, 30, 20, 10, 10])
+
+    def test_compact_tree_matches(self):
+        random.seed(2)
+        for tree in (CompactTree(), SlotBalancedTree()):
+            reference = BalancedTree()
+            nodes = []
+            for i in range(400):
+                key = random.randint(0, 40)
+                nodes.append((tree.add_node(key, i), reference.add_node(key, i)))
+            random.shuffle(nodes)
+            for node, ref_node in nodes[:250]:
+                tree.remove_node(node)
+                reference.remove_node(ref_node)
+            for key in range(45):
+                found, expected = tree.best_match(key), reference.best_match(key)
+                self.assertEqual(found is None, expected is None)
+                if found is not None:
+                    self.assertEqual(tree.node_data(found), expected.data)
+
+    def check_avl(self, node, parent=None):
+        if node is None:
+            return 0
+        self.assertIs(node.parent_node, parent)
+        left = self.check_avl(node.left_child, node)
+        right = self.check_avl(node.right_child, node)
+        self.assertEqual(node.balance_factor, right - left)
+        self.assertLessEqual(abs(right - left), 1)
+        return max(left, right) + 1
+
+    def test_bulk_build_and_batches(self):
+        random.seed(4)
+        keys = sorted(random.randint(0, 300) for _ in range(1000))
+        tree = BalancedTree()
+        nodes = tree.build_from_sorted(keys, list(range(len(keys))))
+        self.assertEqual([node.val for node in tree], keys)
+        self.assertEqual(self.check_avl(tree.tree_root), tree.height())
+        self.assertLessEqual(tree.height(), len(set(keys)).bit_length())
+        tree.remove_node(nodes[500])
+        reference = keys[:500] + keys[501:]
+        for count in (3, 400):
+            batch = [random.randint(0, 300) for _ in range(count)]
+            tree.add_many(batch)
+            reference = sorted(reference + batch)
+            self.check_avl(tree.tree_root)
+            self.assertEqual([node.val for node in tree], reference)
+            self.assertEqual(tree.node_count, len(reference))
+            doomed = random.sample(reference, count)
+            tree.delete_many(doomed)
+            for key in doomed:
+                reference.remove(key)
+            self.check_avl(tree.tree_root)
+            self.assertEqual([node.val for node in tree], reference)
+            self.assertEqual(tree.node_count, len(reference))
+
+    def test_augmented_queries(self):
+        random.seed(5)
+        tree = AugmentedTree()
+        nodes = [tree.add_node(random.randint(1, 100)) for _ in range(300)]
+        for node in random.sample(nodes, 120):
+            tree.remove_node(node)
+        tree.add_many([random.randint(1, 100) for _ in range(200)])
+        keys = sorted(node.val for node in tree)
+        self.check_avl(tree.tree_root)
+        self.assertEqual(tree.tree_root.count, len(keys))
+        for key in (0, 1, 50, 99, 101):
+            self.assertEqual(tree.count_at_least(key), sum(1 for value in keys if value >= key))
+            self.assertEqual(tree.total_at_least(key), sum(value for value in keys if value >= key))
+        for k in (1, 7, len(keys)):
+            self.assertEqual(tree.kth_largest(k).val, keys[-k])
+        self.assertIsNone(tree.kth_largest(len(keys) + 1))
+
+    def test_tlsf_index(self):
+        random.seed(3)
+        tree = TlsfIndex(exact_scan=True)
+        reference = BalancedTree()
+        nodes = []
+        for i in range(600):
+            key = random.choice((random.randint(1, 64), random.randint(1, 1 << 20)))
+            nodes.append((tree.add_node(key, i), reference.add_node(key, i)))
+        random.shuffle(nodes)
+        for node, ref_node in nodes[:350]:
+            tree.remove_node(node)
+            reference.remove_node(ref_node)
+        self.assertEqual(sorted(node.val for node in tree), [node.val for node in reference])
+        self.assertEqual(tree.last().val, reference.last().val)
+        for _ in range(500):
+            key = random.randint(1, 1 << 20)
+            found, expected = tree.best_match(key), reference.best_match(key)
+            self.assertEqual(found is None, expected is None)
+            if found is not None:
+                self.assertGreaterEqual(found.val, key)
+        tree = TlsfIndex()
+        tree.add_node(103)
+        self.assertEqual(tree.best_match(90).val, 103)
+        self.assertIsNone(tree.best_match(101))
+        tree.exact_scan = True
+        self.assertEqual(tree.best_match(101).val, 103)
+
+class KernelTestCases(unittest.TestCase):
+    def test_reset_modes(self):
+        pages = get_pages(4 * config.PAGE_SIZE)
+        pages[:] = b'\x01' * len(pages)
+        reset_area(pages, config.PAGE_SIZE, config.PAGE_SIZE, RESET_POISON)
+        reset_area(pages, config.PAGE_SIZE, 2 * config.PAGE_SIZE, RESET_ZERO)
+        reset_area(pages, config.PAGE_SIZE, 3 * config.PAGE_SIZE, RESET_DISCARD)
+        self.assertEqual(pages[config.PAGE_SIZE - 1], 1)
+        self.assertEqual(pages[config.PAGE_SIZE:2 * config.PAGE_SIZE], b'\x7e' * config.PAGE_SIZE)
+        self.assertEqual(pages[2 * config.PAGE_SIZE:], bytes(2 * config.PAGE_SIZE))
+
+class AllocatorTestCases(unittest.TestCase):
+    def block_offset(self, heap, data):
+        return heap.live[id(data)][1] & OFFSET_MASK
+
+    def test_alloc_returns_arena_view(self):
+        heap = ArenaAllocator(slab_limit=0)
+        data = heap.alloc(100)
+        self.assertEqual(len(data), 100)
+        data[:] = b'\x01' * 100
+        self.assertEqual(len(heap.arenas), 1)
+        self.assertIs(data.obj, heap.arenas[0].pages)
+
+    def test_free_coalesces(self):
+        heap = ArenaAllocator(slab_limit=0)
+        first = heap.alloc(100)
+        second = heap.alloc(200)
+        heap.free(first)
+        heap.free(second)
+        self.assertEqual(list(heap.arenas[0].walk()), [(0, ARENA_SIZE - config.META, False)])
+
+    def test_realloc_keeps_data(self):
+        heap = ArenaAllocator()
+        data = heap.alloc(10)
+        data[:] = bytes(range(10))
+        data = heap.realloc(data, 5000)
+        self.assertEqual(bytes(data[:10]), bytes(range(10)))
+
+    def test_realloc_in_place(self):
+        heap = ArenaAllocator(slab_limit=0)
+        data = heap.alloc(1000)
+        start = self.block_offset(heap, data)
+        data = heap.realloc(data, 3000)
+        self.assertEqual(self.block_offset(heap, data), start)
+        data = heap.realloc(data, 100)
+        self.assertEqual(self.block_offset(heap, data), start)
+        self.assertEqual([(offset, size) for offset, size, _ in heap.arenas[0].walk()][0], (start, 104))
+        self.assertEqual(len(list(heap.arenas[0].walk())), 2)
+
+    def test_compact_tree_index(self):
+        heap = ArenaAllocator(slab_limit=0, tree_class=CompactTree)
+        buffers = [heap.alloc(size) for size in (300, 5000, 70, 20000)]
+        heap.free(buffers[1])
+        heap.free(buffers[2])
+        data = heap.alloc(4000)
+        self.assertEqual(self.block_offset(heap, data), 328)
+        for item in (buffers[0], buffers[3], data):
+            heap.free(item)
+        self.assertEqual(len(list(heap.arenas[0].walk())), 1)
+
+    def test_placement_policies(self):
+        def prepare(placement):
+            heap = ArenaAllocator(slab_limit=0, placement=placement)
+            buffers = [heap.alloc(size) for size in (1000, 100, 400, 100, 1000, 100)]
+            addrs = [self.block_offset(heap, data) for data in buffers]
+            for idx in (0, 2, 4):
+                heap.free(buffers[idx])
+            return heap, addrs
+
+        def placed(heap, length):
+            return self.block_offset(heap, heap.alloc(length))
+
+        heap, addrs = prepare('best_fit')
+        self.assertEqual(placed(heap, 300), addrs[2])
+        self.assertEqual(placed(heap, 900), addrs[4])
+        heap, addrs = prepare('address_fit')
+        self.assertEqual(placed(heap, 300), addrs[2])
+        self.assertEqual(placed(heap, 900), addrs[0])
+        heap, addrs = prepare('first_fit')
+        self.assertEqual(placed(heap, 300), addrs[0])
+        self.assertEqual(placed(heap, 300), addrs[0] + 328)
+        heap, addrs = prepare('next_fit')
+        self.assertGreater(placed(heap, 900), addrs[5])
+        self.assertGreater(placed(heap, 300), addrs[5])
+        with self.assertRaises(ValueError):
+            ArenaAllocator(placement='worst_fit')
+
+    def test_release_unused_pages(self):
+        heap = ArenaAllocator(slab_limit=0, large_limit=0)
+        keep = heap.alloc(100)
+        data = heap.alloc(40000)
+        data[:] = b'\x05' * len(data)
+        heap.free(data)
+        released = heap.released_bytes
+        self.assertGreater(released, 0)
+        self.assertEqual(heap.released_total, released)
+        data = heap.alloc(50000, zero=True)
+        self.assertEqual(bytes(data), bytes(50000))
+        self.assertLess(heap.released_bytes, released - 40000)
+        heap.free(keep)
+
+    def test_large_blocks_bypass_arenas(self):
+        heap = ArenaAllocator()
+        data = heap.alloc(60000)
+        data[:5] = b'hello'
+        self.assertEqual(heap.arenas, [])
+        data = heap.realloc(data, 100000)
+        self.assertEqual(bytes(data[:5]), b'hello')
+        self.assertEqual(heap.stats()['large_bytes'], 102400)
+        data = heap.realloc(data, 1000)
+        self.assertEqual(bytes(data[:5]), b'hello')
+        self.assertEqual(heap.stats()['large_blocks'], 0)
+        heap.free(data)
+
+    def test_large_blocks_with_caller_slices(self):
+        heap = ArenaAllocator()
+        data = heap.alloc(60000)
+        piece = data[:4]
+        heap.free(data)
+        self.assertEqual((heap.stats()['large_blocks'], heap.stats()['large_bytes']), (1, 61440))
+        del piece
+        heap.idle()
+        self.assertEqual((heap.stats()['large_blocks'], heap.stats()['large_bytes']), (0, 0))
+        data = heap.alloc(60000)
+        data[:5] = b'hello'
+        piece = data[:4]
+        data = heap.realloc(data, 200000)
+        self.assertEqual(bytes(data[:5]), b'hello')
+        self.assertEqual(heap.stats()['large_bytes'], 61440 + 200704)
+        del piece
+        heap.idle()
+        self.assertEqual(heap.stats()['large_bytes'], 200704)
+        original = arena_allocator.get_pages
+        arena_allocator.get_pages = lambda length: None
+        try:
+            self.assertIsNone(heap.realloc(data, 500000))
+        finally:
+            arena_allocator.get_pages = original
+        self.assertEqual(bytes(data[:5]), b'hello')
+        heap.free(data)
+        self.assertEqual(heap.stats()['large_bytes'], 0)
+
+    def test_spare_arenas(self):
+        heap = ArenaAllocator(slab_limit=0, spare_arenas=1, large_limit=0)
+        buffers = [heap.alloc(40000) for _ in range(3)]
+        self.assertEqual(heap.stats()['mapped_bytes'], 3 * ARENA_SIZE)
+        for data in buffers:
+            heap.free(data)
+        stats = heap.stats()
+        self.assertEqual((stats['arenas'], stats['spare_arenas']), (1, 1))
+        self.assertEqual(stats['mapped_bytes'], ARENA_SIZE)
+        heap.alloc(40000)
+        self.assertEqual(heap.stats()['spare_arenas'], 0)
+        big = heap.alloc(200000)
+        self.assertEqual(len(heap.arenas), 2)
+        heap.free(big)
+        self.assertEqual(len(heap.arenas), 1)
+
+    def test_arena_kept_while_slice_alive(self):
+        heap = ArenaAllocator(slab_limit=0, spare_arenas=0, large_limit=0)
+        data = heap.alloc(100)
+        piece = data[:4]
+        heap.free(data)
+        stats = heap.stats()
+        self.assertEqual((stats['arenas'], stats['spare_arenas'], stats['mapped_bytes']), (1, 0, ARENA_SIZE))
+        piece[:] = b'abcd'
+        heap.idle()
+        self.assertEqual(heap.stats()['mapped_bytes'], ARENA_SIZE)
+        del piece
+        heap.idle()
+        self.assertEqual(heap.stats()['mapped_bytes'], 0)
+        self.assertEqual((heap.block_count, heap.free_blocks), (0, 0))
+        data = heap.alloc(100)
+        piece = data[:4]
+        heap.free(data)
+        data = heap.alloc(200)
+        self.assertEqual(heap.stats()['arenas'], 1)
+        self.assertEqual(heap.pinned_arenas, set())
+        del piece
+        heap.free(data)
+        self.assertEqual(heap.stats()['mapped_bytes'], 0)
+
+    def test_small_alloc_uses_slabs(self):
+        heap = ArenaAllocator()
+        first = heap.alloc(20)
+        second = heap.alloc(30)
+        self.assertEqual(heap.arenas, [])
+        self.assertIs(first.obj, second.obj)
+        heap.free(first)
+        third = heap.alloc(25)
+        self.assertTrue(heap.slabs.owns(third))
+        self.assertEqual(len(heap.slabs.size_class(25).slabs), 1)
+
+    def test_free_unknown(self):
+        heap = ArenaAllocator()
+        with self.assertRaises(ValueError):
+            heap.free(memoryview(bytearray(8)))
+
+    def test_bulk_alloc_and_free(self):
+        heap = ArenaAllocator(large_limit=40000)
+        lengths = [3000, 20, 500, 40, 8000, 20, 50000, 1200, 30000, 30000]
+        buffers = heap.alloc_many(lengths)
+        self.assertEqual([len(data) for data in buffers], lengths)
+        for pos, data in enumerate(buffers):
+            data[:] = bytes([pos]) * len(data)
+        for pos, data in enumerate(buffers):
+            self.assertEqual(data.tobytes(), bytes([pos]) * len(data))
+        self.assertEqual(len(heap.large), 1)
+        self.assertEqual(heap.slabs.used_bytes, 512 + 48 + 32 * 2)
+        self.assertEqual([self.block_offset(heap, buffers[idx]) for idx in (0, 4, 7)], [0, 3024, 11048])
+        self.assertEqual(len(heap.arenas), 2)
+        heap.free_many(buffers[:5])
+        heap.free_many(buffers[5:])
+        self.assertEqual(heap.stats()['in_use_bytes'], 0)
+        self.assertEqual(heap.stats()['free_blocks'], len(heap.arenas))
+        for arena in heap.arenas:
+            self.assertEqual(len(list(arena.walk())), 1)
+
+    def test_deferred_coalescing(self):
+        heap = ArenaAllocator(slab_limit=0, large_limit=0, deferred_limit=5000)
+        buffers = [heap.alloc(size) for size in (1000, 2000, 1000, 3000)]
+        first = heap.live[id(buffers[0])][1]
+        heap.free(buffers[0])
+        heap.free(buffers[1])
+        self.assertEqual(heap.stats()['deferred_bytes'], 3000)
+        self.assertEqual(len(list(heap.arenas[0].walk())), 5)
+        data = heap.alloc(1000)
+        self.assertEqual(heap.live[id(data)][1], first)
+        heap.free(data)
+        heap.free(buffers[3])
+        self.assertEqual(heap.stats()['deferred_bytes'], 3000)
+        self.assertEqual(heap.stats()['free_blocks'], 1)
+        self.assertEqual(len(list(heap.arenas[0].walk())), 4)
+        self.assertEqual(list(heap.deferred[1000]), [first])
+        heap.free(buffers[2])
+        self.assertEqual(heap.stats()['deferred_bytes'], 4000)
+        data = heap.alloc(65000)
+        self.assertEqual(self.block_offset(heap, data), 0)
+        self.assertEqual(len(heap.arenas), 1)
+        heap.free(data)
+        heap.idle()
+        self.assertEqual(len(list(heap.arenas[0].walk())), 1)
+
+    def test_handles_detect_stale_access(self):
+        heap = ArenaAllocator(large_limit=40000)
+        for length in (100, 3000, 50000):
+            data = heap.alloc(length)
+            handle = heap.handle(data)
+            handle[:3] = b'abc'
+            piece = handle[:3]
+            self.assertEqual(piece, b'abc')
+            with self.assertRaises(IndexError):
+                handle[length]
+            heap.free(data)
+            self.assertFalse(handle.alive)
+            with self.assertRaises(ValueError):
+                handle[0]
+            with self.assertRaises(ValueError):
+                handle[:3]
+            self.assertEqual(piece, b'abc')
+            reused = heap.handle(heap.alloc(length))
+            self.assertTrue(reused.alive)
+            self.assertFalse(handle.alive)
+        handle = MemoryController.alloc_handle(5000)
+        resized = MemoryController.change_size(handle, 6000)
+        with self.assertRaises(ValueError):
+            len(handle)
+        self.assertEqual(len(resized), 6000)
+        MemoryController.free_bytes(resized)
+        self.assertFalse(resized.alive)
+
+    def test_poison_freed(self):
+        heap = ArenaAllocator(poison_freed=True)
+        tree = heap.alloc(3000)
+        tree[:] = bytes(3000)
+        arena, offset = heap._locate(heap.live[id(tree)][1])
+        heap.free(tree)
+        start = offset + config.META
+        self.assertEqual(arena.view[start:start + 3000].tobytes(), b'\x7e' * 3000)
+        small = heap.alloc(100)
+        _, slab, offset = heap.slabs.live[id(small)]
+        small[:] = bytes(100)
+        heap.free(small)
+        self.assertEqual(slab.view[offset:offset + 100].tobytes(), b'\x7e' * 100)
+
+    def test_snapshot_restore(self):
+        path = os.path.join(tempfile.mkdtemp(), 'heap.snap')
+        heap = ArenaAllocator(large_limit=40000)
+        buffers = [heap.alloc(size) for size in (100, 3000, 70000, 20000, 9000, 40)]
+        for pos, data in enumerate(buffers):
+            data[:] = bytes([pos + 1]) * len(data)
+        heap.free(buffers.pop(3))
+        expected = {heap.address(data): data.tobytes() for data in buffers}
+        heap.snapshot(path)
+        restored, loaded = ArenaAllocator.restore(path, large_limit=40000)
+        self.assertEqual({addr: data.tobytes() for addr, data in loaded.items()}, expected)
+        self.assertEqual([restored.address(data) for data in loaded.values()], list(loaded))
+        for key in ('free_bytes', 'free_blocks', 'largest_free', 'in_use_bytes', 'arenas', 'large_bytes'):
+            self.assertEqual(restored.stats()[key], heap.stats()[key], key)
+        restored.free(loaded.pop(heap.address(buffers[3])))
+        data = restored.alloc(30000, zero=True)
+        self.assertEqual(data.tobytes(), bytes(30000))
+        large = restored.alloc(50000)
+        self.assertNotIn(restored.address(large), loaded)
+        addr = heap.address(buffers[2])
+        loaded[addr] = restored.realloc(loaded[addr], 100000)
+        self.assertEqual(loaded[addr][:70000].tobytes(), bytes([3]) * 70000)
+        restored.snapshot(path)
+        self.assertEqual(loaded[heap.address(buffers[0])].tobytes(), bytes([1]) * 100)
+        again, reloaded = ArenaAllocator.restore(path, large_limit=40000)
+        self.assertEqual(len(reloaded), len(loaded) + 2)
+        self.assertEqual(reloaded[heap.address(buffers[4])].tobytes(), bytes([6]) * 40)
+        self.assertEqual(again.stats()['in_use_bytes'], restored.stats()['in_use_bytes'])
+        self.assertEqual([name for name in os.listdir(os.path.dirname(path))], ['heap.snap'])
+        with open(path, 'r+b') as damaged:
+            damaged.write(b'broken')
+        with self.assertRaises(ValueError):
+            ArenaAllocator.restore(path)
+
+    def test_stats_follow_tree(self):
+        for placement in placement_module.PLACEMENTS:
+            self.check_stats(ArenaAllocator(spare_arenas=2, placement=placement))
+        self.check_stats(ArenaAllocator(spare_arenas=2, deferred_limit=64 * 1024))
+
+    def check_stats(self, heap):
+        rnd = random.Random(config.SEED)
+        buffers = []
+        for _ in range(2000):
+            if buffers and rnd.random() < 0.45:
+                heap.free(buffers.pop(rnd.randrange(len(buffers))))
+            elif buffers and rnd.random() < 0.2:
+                idx = rnd.randrange(len(buffers))
+                buffers[idx] = heap.realloc(buffers[idx], rnd.randint(1, 20000))
+            else:
+                buffers.append(heap.alloc(rnd.randint(1, 50000)))
+            sizes = [heap._addr_size(heap.free_tree.node_data(node)) for node in heap.free_tree]
+            stats = heap.stats()
+            self.assertEqual(stats['free_bytes'], sum(sizes))
+            self.assertEqual(stats['free_blocks'], len(sizes))
+            self.assertEqual(stats['largest_free'], max(sizes, default=0))
+            self.assertEqual(sum(stats['free_histogram'].values()), len(sizes))
+        blocks = sum(size for arena in heap.arenas for _, size, used in arena.walk() if used)
+        self.assertEqual(stats['in_use_bytes'], blocks + heap.slabs.used_bytes + heap.large_bytes - heap.deferred_bytes)
+        for data in buffers:
+            heap.free(data)
+        self.assertEqual(heap.stats()['in_use_bytes'], 0)
+
+    def test_free_size_queries(self):
+        for placement in ('augmented', 'best_fit', 'tlsf'):
+            heap = ArenaAllocator(slab_limit=0, placement=placement)
+            buffers = [heap.alloc(size) for size in (1000, 100, 2000, 100, 3000, 100)]
+            for idx in (0, 2, 4):
+                heap.free(buffers[idx])
+            tail = heap.stats()['largest_free']
+            self.assertEqual(heap.free_at_least(2000), (3, 5000 + tail))
+            self.assertEqual(heap.free_at_least(1), (4, 6000 + tail))
+            self.assertEqual(heap.kth_largest_free(2), 3000)
+            self.assertIsNone(heap.kth_largest_free(5))
+
+    def test_stats_exporter(self):
+        path = os.path.join(tempfile.mkdtemp(), 'stats.jsonl')
+        heap = ArenaAllocator()
+        exporter = heap_stats.StatsExporter(heap, interval=0.01, history=3, path=path)
+        heap.alloc(1000)
+        self.assertEqual(exporter.sample()['in_use_bytes'], 1000)
+        exporter.start()
+        time.sleep(0.1)
+        exporter.stop()
+        self.assertEqual(len(exporter.history), 3)
+        with open(path) as samples:
+            self.assertEqual(json.loads(samples.readline())['free_bytes'], heap.free_bytes)
+
+class ThreadCacheTestCases(unittest.TestCase):
+    def test_free_goes_to_thread_cache(self):
+        heap = ThreadCachedAllocator(cache_limit=4, batch=2)
+        size_class = heap.heap.slabs.size_class(40)
+        buffers = [heap.alloc(40) for _ in range(6)]
+        for data in buffers:
+            heap.free(data)
+        self.assertEqual(heap.stats()['thread_cached'], 4)
+        heap.flush()
+        self.assertEqual(heap.stats()['thread_cached'], 0)
+        self.assertEqual(sum(slab.used for slab in size_class.slabs), 0)
+
+    def test_thread_exit_drains_cache(self):
+        heap = ThreadCachedAllocator()
+        def worker():
+            for data in [heap.alloc(64) for _ in range(100)]:
+                heap.free(data)
+        for _ in range(10):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+        stats = heap.stats()
+        self.assertEqual((stats['slab_used_bytes'], stats['thread_cached']), (0, 0))
+        self.assertEqual(heap.caches, {})
+        heap.free(heap.alloc(64))
+        inner = weakref.ref(heap.heap)
+        del heap
+        gc.collect()
+        self.assertIsNone(inner())
+
+    def test_background_compactor(self):
+        heap = ThreadCachedAllocator(ArenaAllocator(deferred_limit=1 << 20))
+        heap.start_compactor(0.01)
+        try:
+            for data in [heap.alloc(2000) for _ in range(20)]:
+                heap.free(data)
+            self.assertEqual(heap.stats()['deferred_blocks'], 20)
+            time.sleep(0.1)
+        finally:
+            heap.stop_compactor()
+        self.assertEqual(heap.stats()['deferred_blocks'], 0)
+
+    def test_concurrent_workers(self):
+        heap = ThreadCachedAllocator()
+        failures = []
+        def worker(seed):
+            rnd = random.Random(seed)
+            pool = []
+            for _ in range(2000):
+                if pool and rnd.getrandbits(1):
+                    data, tag = pool.pop(rnd.randrange(len(pool)))
+                    if bytes(data) != bytes([tag]) * len(data):
+                        failures.append(seed)
+                    heap.free(data)
+                else:
+                    data = heap.alloc(rnd.choice((rnd.randint(1, 512), rnd.randint(513, 20000))))
+                    tag = rnd.randrange(256)
+                    data[:] = bytes([tag]) * len(data)
+                    pool.append((data, tag))
+            for data, _ in pool:
+                heap.free(data)
+            heap.flush()
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+        self.assertEqual(heap.heap.live, {})
+        self.assertEqual(heap.heap.slabs.live, {})
+
+class CheckerTestCases(unittest.TestCase):
+    def test_hash_modes(self):
+        data = bytearray(b'allocator' * 10)
+        try:
+            for name in ('legacy', 'crc32', 'blake2b'):
+                memory_checker.set_hash_mode(name)
+                before = memory_checker.compute_hash(data, 90)
+                self.assertEqual(before, memory_checker.compute_hash(memoryview(data), 90))
+                data[45] ^= 1
+                self.assertNotEqual(before, memory_checker.compute_hash(data, 90))
+        finally:
+            memory_checker.set_hash_mode(config.CHECK_HASH)
+        with self.assertRaises(ValueError):
+            memory_checker.set_hash_mode('md5')
+
+    def test_incremental_checks_neighbours(self):
+        heap = ArenaAllocator(slab_limit=0, large_limit=0)
+        pool = [memory_checker.SegmentData() for _ in range(3)]
+        tracker = memory_checker.IntegrityTracker(pool, sweep_every=1000)
+        for idx, item in enumerate(pool):
+            item.data_buffer = heap.alloc(100)
+            item.data_length = 100
+            memory_checker.fill_data(item.data_buffer, 100)
+            item.data_hash = memory_checker.compute_hash(item.data_buffer, 100)
+            tracker.track(idx)
+        self.assertTrue(tracker.verify())
+        pool[1].data_buffer[0] ^= 1
+        self.assertTrue(tracker.verify())
+        tracker.forget(0)
+        tracker.track(0)
+        self.assertFalse(tracker.verify())
+
+class BenchTestCases(unittest.TestCase):
+    def test_traces_balance(self):
+        for name, workload in alloc_bench.WORKLOADS.items():
+            live = set()
+            for op, ident, size in workload(random.Random(config.SEED), 2000):
+                if op == alloc_bench.OP_ALLOC:
+                    self.assertNotIn(ident, live)
+                    live.add(ident)
+                else:
+                    self.assertIn(ident, live)
+                    if op == alloc_bench.OP_FREE:
+                        live.remove(ident)
+            self.assertEqual(live, set(), name)
+
+    def test_run_trace(self):
+        ops = list(alloc_bench.uniform_trace(random.Random(config.SEED), 500))
+        result = alloc_bench.run_trace(ArenaAllocator(), ops)
+        self.assertEqual(result['ops'], len(ops))
+        self.assertLessEqual(result['p50_ns'], result['p99_ns'])
+
+    def test_record_and_replay(self):
+        path = os.path.join(tempfile.mkdtemp(), 'trace.bin')
+        MemoryController.start_recording(path)
+        try:
+            first = MemoryController.alloc_bytes(100)
+            second = MemoryController.alloc_bytes(5000)
+            first = MemoryController.change_size(first, 300)
+            MemoryController.free_bytes(second)
+            MemoryController.free_bytes(first)
+        finally:
+            MemoryController.stop_recording()
+        ops = list(alloc_trace.read_trace(path))
+        self.assertEqual([op[:3] for op in ops], [(alloc_trace.OP_ALLOC, 0, 100), (alloc_trace.OP_ALLOC, 1, 5000),
+                                                  (alloc_trace.OP_REALLOC, 0, 300), (alloc_trace.OP_FREE, 1, 0),
+                                                  (alloc_trace.OP_FREE, 0, 0)])
+        heap = ArenaAllocator()
+        self.assertEqual(alloc_trace.replay_trace(path, heap), {})
+        self.assertEqual(heap.live, {})
+
+class StartupTestCases(unittest.TestCase):
+    def test_parse_importtime(self):
+        entries = startup_profile.parse_importtime([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   block_manager",
+            "import time:       300 |        420 | arena_allocator",
+        ])
+        self.assertEqual(entries, [('block_manager', 120, 120, 1), ('arena_allocator', 300, 420, 0)])
+
+    def test_profile_startup(self):
+        profile = startup_profile.profile_startup(runs=1)
+        names = [entry[0] for entry in profile['modules']]
+        self.assertEqual(names[-1], 'main_app')
+        self.assertIn('arena_allocator', names)
+        self.assertGreater(profile['first_alloc_ns'], 0)
+        self.assertEqual(profile['eager_modules'], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import weakref
+import threading
+import config
+from arena_allocator import ArenaAllocator
+
+class CountingLock:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.contended = 0
+
+    def __enter__(self):
+        if not self.lock.acquire(blocking=False):
+            self.contended += 1
+            self.lock.acquire()
+        self.acquired += 1
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+class CacheOwner:
+    pass
+
+def drain_cache(allocator_ref, cache):
+    allocator = allocator_ref()
+    if allocator is not None:
+        allocator._drain(cache)
+
+class ThreadCachedAllocator:
+    def __init__(self, heap=None, cache_limit=config.THREAD_CACHE_LIMIT, batch=config.THREAD_CACHE_BATCH):
+        self.heap = heap if heap is not None else ArenaAllocator()
+        self.cache_limit = cache_limit
+        self.batch = batch
+        self.lock = CountingLock()
+        self.local = threading.local()
+        self.caches = {}
+        self.compactor = None
+        self.compactor_stop = threading.Event()
+
+    def _cache(self):
+        cache = getattr(self.local, 'cache', None)
+        if cache is None:
+            cache = self.local.cache = {}
+            owner = self.local.owner = CacheOwner()
+            weakref.finalize(owner, drain_cache, weakref.ref(self), cache).atexit = False
+            with self.lock:
+                self.caches[id(cache)] = cache
+        return cache
+
+    def _return_slots(self, cache):
+        for slots in cache.values():
+            self.heap.slabs.put(slots)
+            del slots[:]
+
+    def _drain(self, cache):
+        with self.lock:
+            self._return_slots(cache)
+            del self.caches[id(cache)]
+
+    def _small_class(self, length):
+        slabs = self.heap.slabs
+        if slabs is None or length > self.heap.slab_limit:
+            return None
+        return slabs.size_class(length)
+
+    def alloc(self, length, zero=False):
+        size_class = self._small_class(length)
+        if size_class is None:
+            with self.lock:
+                return self.heap.alloc(length, zero)
+        slots = self._cache().setdefault(size_class.slot_size, [])
+        if not slots:
+            with self.lock:
+                slots.extend(self.heap.slabs.take(size_class, self.batch))
+            if not slots:
+                return None
+        slab, offset = slots.pop()
+        data = self.heap.slabs.expose(slab, offset, length)
+        if zero:
+            data[:] = bytes(length)
+        return data
+
+    def free(self, data):
+        if data is None:
+            return
+        slabs = self.heap.slabs
+        if slabs is None or not slabs.owns(data):
+            with self.lock:
+                self.heap.free(data)
+            return
+        slab, offset = slabs.release_slot(data)
+        slots = self._cache().setdefault(slab.slot_size, [])
+        slots.append((slab, offset))
+        if len(slots) > self.cache_limit:
+            spill = slots[:self.batch]
+            del slots[:self.batch]
+            with self.lock:
+                slabs.put(spill)
+
+    def realloc(self, data, length):
+        with self.lock:
+            return self.heap.realloc(data, length)
+
+    def handle(self, data):
+        return self.heap.handle(data)
+
+    def address(self, data):
+        return self.heap.address(data)
+
+    def alloc_many(self, lengths):
+        with self.lock:
+            return self.heap.alloc_many(lengths)
+
+    def free_many(self, buffers):
+        with self.lock:
+            self.heap.free_many(buffers)
+
+    def flush(self):
+        cache = getattr(self.local, 'cache', None)
+        if not cache:
+            return
+        with self.lock:
+            self._return_slots(cache)
+
+    def idle(self):
+        with self.lock:
+            self.heap.idle()
+
+    def _compact(self, interval):
+        while not self.compactor_stop.wait(interval):
+            self.idle()
+
+    def start_compactor(self, interval=0.05):
+        if self.compactor is not None:
+            return
+        self.compactor_stop.clear()
+        self.compactor = threading.Thread(target=self._compact, args=(interval,), daemon=True)
+        self.compactor.start()
+
+    def stop_compactor(self):
+        if self.compactor is None:
+            return
+        self.compactor_stop.set()
+        self.compactor.join()
+        self.compactor = None
+
+    def free_at_least(self, size):
+        with self.lock:
+            return self.heap.free_at_least(size)
+
+    def kth_largest_free(self, k):
+        with self.lock:
+            return self.heap.kth_largest_free(k)
+
+    def snapshot(self, path):
+        with self.lock:
+            self.heap.snapshot(path)
+
+    def stats(self):
+        with self.lock:
+            stats = self.heap.stats()
+            caches = list(self.caches.values())
+        stats['lock_acquired'] = self.lock.acquired
+        stats['lock_contended'] = self.lock.contended
+        stats['thread_cached'] = sum(len(slots) for cache in caches for slots in cache.copy().values())
+        return stats
+
+    def show(self, msg):
+        with self.lock:
+            self.heap.show(msg)
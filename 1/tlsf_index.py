@@ -0,0 +1,117 @@
+SL_BITS = 4
+SL_COUNT = 1 << SL_BITS
+FL_COUNT = 64 - SL_BITS
+
+class TlsfNode:
+    __slots__ = ('val', 'data', 'fl', 'sl', 'prev_node', 'next_node')
+
+    def __init__(self, val, data=None):
+        self.val = val
+        self.data = data
+        self.fl = 0
+        self.sl = 0
+        self.prev_node = None
+        self.next_node = None
+
+def mapping(size):
+    fl = size.bit_length()
+    if fl <= SL_BITS:
+        return 0, size
+    return fl - SL_BITS, (size >> (fl - 1 - SL_BITS)) - SL_COUNT
+
+def mapping_search(size):
+    fl = size.bit_length()
+    if fl > SL_BITS:
+        size += (1 << (fl - 1 - SL_BITS)) - 1
+    return mapping(size)
+
+def lowest_bit(bitmap):
+    return (bitmap & -bitmap).bit_length() - 1
+
+class TlsfIndex:
+    def __init__(self, exact_scan=False):
+        self.exact_scan = exact_scan
+        self.fl_bitmap = 0
+        self.sl_bitmaps = [0] * FL_COUNT
+        self.heads = [[None] * SL_COUNT for _ in range(FL_COUNT)]
+
+    def add_node(self, key, data=None):
+        node = TlsfNode(key, data)
+        fl, sl = node.fl, node.sl = mapping(key)
+        head = self.heads[fl][sl]
+        node.next_node = head
+        if head:
+            head.prev_node = node
+        self.heads[fl][sl] = node
+        self.fl_bitmap |= 1 << fl
+        self.sl_bitmaps[fl] |= 1 << sl
+        return node
+
+    def remove_node(self, node):
+        fl, sl = node.fl, node.sl
+        if node.prev_node:
+            node.prev_node.next_node = node.next_node
+        else:
+            self.heads[fl][sl] = node.next_node
+        if node.next_node:
+            node.next_node.prev_node = node.prev_node
+        node.prev_node = node.next_node = None
+        if not self.heads[fl][sl]:
+            self.sl_bitmaps[fl] &= ~(1 << sl)
+            if not self.sl_bitmaps[fl]:
+                self.fl_bitmap &= ~(1 << fl)
+
+    def delete_node(self, key):
+        fl, sl = mapping(key)
+        node = self.heads[fl][sl]
+        while node and node.val != key:
+            node = node.next_node
+        if node:
+            self.remove_node(node)
+
+    def node_data(self, node):
+        return node.data
+
+    def best_match(self, key):
+        fl, sl = mapping_search(key)
+        if fl < FL_COUNT:
+            sl_map = self.sl_bitmaps[fl] & (-1 << sl)
+            if not sl_map:
+                fl_map = self.fl_bitmap & (-1 << (fl + 1))
+                if fl_map:
+                    fl = lowest_bit(fl_map)
+                    sl_map = self.sl_bitmaps[fl]
+            if sl_map:
+                return self.heads[fl][lowest_bit(sl_map)]
+        if not self.exact_scan:
+            return None
+        fl, sl = mapping(key)
+        node = self.heads[fl][sl]
+        while node and node.val < key:
+            node = node.next_node
+        return node
+
+    def last(self):
+        if not self.fl_bitmap:
+            return None
+        fl = self.fl_bitmap.bit_length() - 1
+        node = self.heads[fl][self.sl_bitmaps[fl].bit_length() - 1]
+        largest = node
+        while node:
+            if node.val > largest.val:
+                largest = node
+            node = node.next_node
+        return largest
+
+    def height(self):
+        return 0
+
+    def __iter__(self):
+        for fl in range(FL_COUNT):
+            if not self.fl_bitmap >> fl & 1:
+                continue
+            for sl in range(SL_COUNT):
+                node = self.heads[fl][sl]
+                while node:
+                    yield node
+                    node = node.next_node